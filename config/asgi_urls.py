@@ -0,0 +1,19 @@
+"""
+URL configuration of the ASGI application.
+
+The same URLs as config.urls, with the catalog reads of store.asyncviews in
+front of the ViewSet routes they fall back to. Selected per request by
+store.asyncviews.async_routes_middleware when STORE_ASYNC_VIEWS is on.
+"""
+from django.urls import re_path
+
+from store import asyncviews
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    re_path(r'^products/$', asyncviews.ProductListView.as_view(), name='products-list'),
+    re_path(r'^products/(?P<pk>[^/.]+)/$', asyncviews.ProductDetailView.as_view(), name='products-detail'),
+    re_path(r'^collection/$', asyncviews.CollectionListView.as_view(), name='collection-list'),
+    re_path(r'^carts/(?P<pk>[^/.]+)/$', asyncviews.CartDetailView.as_view(), name='cart-detail'),
+] + sync_urlpatterns
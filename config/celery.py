@@ -0,0 +1,20 @@
+import os
+
+from celery import Celery
+from celery.signals import celeryd_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@celeryd_init.connect
+def use_worker_databases(**kwargs):
+    # runs in `celery worker` only, before the pool processes are forked. The
+    # dicts are updated in place, the connection handler holds on to them
+    from django.conf import settings
+    for alias, database in getattr(settings, 'STORE_CELERY_DATABASES', {}).items():
+        if alias in settings.DATABASES:
+            settings.DATABASES[alias].update(database)
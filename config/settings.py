@@ -29,11 +29,15 @@ INSTALLED_APPS = [
     'djoser',
     'django_filters',
     'tags.apps.TagsConfig',
+    'likes.apps.LikesConfig',
     "store.apps.StoreConfig",
     "core.apps.CoreConfig",
 ]
 
 MIDDLEWARE = [
+    'store.profiling.ProfilingMiddleware',
+    # with STORE_ASYNC_VIEWS, ASGI requests are routed through STORE_ASGI_URLCONF, see store.asyncviews
+    'store.asyncviews.async_routes_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -44,6 +48,10 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'config.urls'
+# under ASGI the product, collection and cart reads can be served by async
+# views, see store.asyncviews. Off by default: every request goes to the ViewSets
+STORE_ASYNC_VIEWS = config('STORE_ASYNC_VIEWS', default=False, cast=bool)
+STORE_ASGI_URLCONF = 'config.asgi_urls'
 
 TEMPLATES = [
     {
@@ -66,14 +74,127 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+# store.db.postgresql is the stock backend plus an optional connection pool.
+# Without DB_POOL connections persist for DB_CONN_MAX_AGE seconds in the thread
+# that opened them, which is enough for WSGI worker threads. ASGI runs every
+# request in a new thread, so connections can only be reused there with DB_POOL.
+# The Celery worker gets its own sizing, see STORE_CELERY_DATABASES.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
+
+def database(conn_max_age, pool_min_size, pool_max_size):
+    db = {
+        'ENGINE': 'store.db.postgresql',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         "PASSWORD": config('DB_PASSWORD'),
-        "HOST": config('DB_HOST')
+        "HOST": config('DB_HOST'),
+        "PORT": config('DB_PORT', default=''),
+        # pooled connections are returned to the pool at the end of every request
+        'CONN_MAX_AGE': 0 if DB_POOL else conn_max_age,
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {},
     }
+    if DB_POOL:
+        db['OPTIONS']['pool'] = {
+            'min_size': pool_min_size,
+            'max_size': pool_max_size,
+            'timeout': config('DB_POOL_TIMEOUT', default=10.0, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=600.0, cast=float),
+        }
+    return db
+
+
+# sized for the web process: one connection per worker thread
+DATABASES = {
+    'default': database(
+        conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+        pool_min_size=config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        pool_max_size=config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    )
+}
+
+# replaces DATABASES in `celery worker` processes, see config.celery. Tasks run
+# one at a time per process by default, they need few but long-lived connections
+STORE_CELERY_DATABASES = {
+    'default': database(
+        conn_max_age=config('CELERY_DB_CONN_MAX_AGE', default=600, cast=int),
+        pool_min_size=config('CELERY_DB_POOL_MIN_SIZE', default=1, cast=int),
+        pool_max_size=config('CELERY_DB_POOL_MAX_SIZE', default=2, cast=int),
+    )
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# cached product / collection responses, invalidated through per-model versions.
+# The versions are stored in this cache: LocMemCache is per process, so with
+# several workers it must be a shared backend (`check --deploy` warns, store.W001)
+STORE_CACHE_ALIAS = 'default'
+STORE_CACHE_TIMEOUT = 60 * 5
+
+# product search backend, by default tsvector on PostgreSQL and an inverted index elsewhere
+STORE_SEARCH_BACKEND = None
+
+# how long POST /carts/{id}/reserve/ holds the stock of a cart
+STORE_RESERVATION_TTL = timedelta(minutes=15)
+
+# carts older than this are deleted by `manage.py sweep_carts` / the celery beat task
+STORE_CART_MAX_AGE = timedelta(days=7)
+STORE_CART_SWEEP_BATCH_SIZE = 1000
+
+# list actions render values() rows through compiled row functions, see store.api.fastpath
+STORE_FAST_LIST = True
+
+# rows fetched per server-side cursor round trip by the /export/ endpoints
+STORE_EXPORT_CHUNK_SIZE = 2000
+
+# products per transaction of `manage.py import_catalog` / the admin feed import
+STORE_IMPORT_BATCH_SIZE = 5000
+
+# JWT requests read their user and customer from the cache for this many seconds
+STORE_USER_CACHE_TIMEOUT = 60
+
+# like counters are buffered in process and flushed in batches, see likes.buffer
+LIKES_BUFFER_SIZE = 1000
+LIKES_FLUSH_INTERVAL = 1.0
+LIKES_COUNTER_SHARDS = 8
+
+# per-request query count / timing, see store.profiling.ProfilingMiddleware.
+# budgets are per 'METHOD view name', requests without one are not checked, and
+# include the query that loads the JWT user
+STORE_SERVER_TIMING = DEBUG
+STORE_QUERY_BUDGETS = {
+    'GET products-list': 4,
+    'GET products-detail': 3,
+    'GET collection-list': 2,
+    'GET collection-detail': 2,
+    'GET product-reviews-list': 2,
+    'GET cart-detail': 3,
+    'GET cart-items-list': 2,
+    'GET customer-list': 2,
+    'GET customer-me': 2,
+    'GET orders-list': 4,
+    'GET orders-detail': 4,
+}
+
+# Celery
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/1')
+CELERY_BEAT_SCHEDULE = {
+    'sweep-expired-carts': {
+        'task': 'store.tasks.sweep_expired_carts',
+        'schedule': timedelta(hours=1),
+    },
+    'release-expired-reservations': {
+        'task': 'store.tasks.release_expired_reservations',
+        'schedule': timedelta(minutes=1),
+    },
 }
 
 # Password validation
@@ -121,8 +242,8 @@ REST_FRAMEWORK = {
     #     'rest_framework.authentication.TokenAuthentication',
     # ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-
+        # JWTAuthentication with the user and its customer cached, see store.authentication
+        'store.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LikesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'likes'
+
+    def ready(self):
+        import atexit
+
+        from .buffer import like_buffer
+        # whatever is still buffered when the process stops
+        atexit.register(like_buffer.flush)
@@ -0,0 +1,104 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from .models import LikeCounter
+
+logger = logging.getLogger(__name__)
+
+# ============================= buffered like counters ========================
+# a like or unlike adds +1 / -1 to an in-process buffer instead of updating the
+# counter row of its object. The buffer is written when it holds LIKES_BUFFER_SIZE
+# objects, or by a daemon thread of the process every LIKES_FLUSH_INTERVAL
+# seconds, as one INSERT ... ON CONFLICT DO UPDATE adding every delta to a random
+# shard. A burst of likes on a popular product is one row update per flush, not
+# one per like, and the last likes of a quiet process are not left in memory.
+# Deltas still buffered when a process dies are lost: `manage.py sync_like_counts`
+# rebuilds the counters from the likes.
+BUFFER_SIZE = getattr(settings, 'LIKES_BUFFER_SIZE', 1000)
+FLUSH_INTERVAL = getattr(settings, 'LIKES_FLUSH_INTERVAL', 1.0)
+COUNTER_SHARDS = getattr(settings, 'LIKES_COUNTER_SHARDS', 8)
+
+
+def write_deltas(deltas):
+    """Add [(content_type_id, object_id, shard, delta)] to the counters in one statement."""
+    table = connection.ops.quote_name(LikeCounter._meta.db_table)
+    columns = [connection.ops.quote_name(LikeCounter._meta.get_field(name).column)
+               for name in ('content_type', 'object_id', 'shard', 'count')]
+    count = columns[-1]
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(deltas))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES {values} '
+            f'ON CONFLICT ({", ".join(columns[:3])}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+            [value for delta in deltas for value in delta])
+
+
+class LikeBuffer:
+    def __init__(self, max_size=BUFFER_SIZE, interval=FLUSH_INTERVAL, shards=COUNTER_SHARDS):
+        self.max_size = max_size
+        self.interval = interval
+        self.shards = shards
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.last_flush = time.monotonic()
+        # pid of the process the flusher thread runs in, threads do not survive a fork
+        self.flusher_pid = None
+
+    def add(self, content_type_id, object_id, delta):
+        with self.lock:
+            self.pending[content_type_id, object_id] += delta
+            full = len(self.pending) >= self.max_size
+            start = self.flusher_pid != os.getpid()
+            if start:
+                self.flusher_pid = os.getpid()
+        if start:
+            threading.Thread(target=self.run_flusher, name='like-buffer-flusher', daemon=True).start()
+        if full:
+            self.flush()
+
+    def run_flusher(self):
+        pid = os.getpid()
+        while self.flusher_pid == pid:
+            time.sleep(self.interval)
+            if time.monotonic() - self.last_flush < self.interval:
+                # flushed by add() in the meantime
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('flushing the like buffer failed')
+            finally:
+                # the thread's own connection, back to the pool until the next flush
+                connection.close()
+
+    def pending_delta(self, content_type_id, object_id):
+        with self.lock:
+            return self.pending.get((content_type_id, object_id), 0)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        # sorted, so concurrent flushes lock the counter rows in the same order
+        deltas = [(content_type_id, object_id, random.randrange(self.shards), delta)
+                  for (content_type_id, object_id), delta in sorted(pending.items()) if delta]
+        if not deltas:
+            return 0
+        try:
+            write_deltas(deltas)
+        except Exception:
+            # keep them for the next flush
+            with self.lock:
+                self.pending.update(pending)
+            raise
+        return len(deltas)
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,74 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+
+from .buffer import like_buffer
+from .models import LikeCounter, Likes
+
+
+# ============================= like / unlike ========================
+# both are idempotent: liking twice keeps one like, unliking an object that is
+# not liked changes nothing. Only an actual change reaches the counter buffer,
+# once the transaction commits. Objects are given by the id of their content
+# type, resolved once per request by the caller.
+def like(user, type_id, object_id):
+    """Like an object, return False when the user already liked it."""
+    try:
+        with transaction.atomic():
+            Likes.objects.create(user=user, content_type_id=type_id, object_id=object_id)
+    except IntegrityError:
+        # (user, content_type, object_id) is unique
+        return False
+    transaction.on_commit(lambda: like_buffer.add(type_id, object_id, 1))
+    return True
+
+
+def unlike(user, type_id, object_id):
+    """Remove a like, return False when there was none."""
+    deleted, _ = Likes.objects.filter(user=user, content_type_id=type_id, object_id=object_id).delete()
+    if deleted:
+        transaction.on_commit(lambda: like_buffer.add(type_id, object_id, -deleted))
+    return bool(deleted)
+
+
+def is_liked(user, type_id, object_id):
+    return (user.is_authenticated and
+            Likes.objects.filter(user=user, content_type_id=type_id, object_id=object_id).exists())
+
+
+def like_count(type_id, object_id):
+    """Stored count plus what this process has not flushed yet."""
+    stored = LikeCounter.objects.filter(content_type_id=type_id, object_id=object_id).aggregate(total=Sum('count'))
+    return (stored['total'] or 0) + like_buffer.pending_delta(type_id, object_id)
+
+
+# ============================= rebuild / verify ========================
+def actual_like_counts():
+    return (Likes.objects.values('content_type_id', 'object_id').order_by()
+            .annotate(total=Count('id')))
+
+
+def rebuild_like_counts():
+    """Replace every counter by one shard holding the number of likes."""
+    like_buffer.flush()
+    with transaction.atomic():
+        LikeCounter.objects.all().delete()
+        LikeCounter.objects.bulk_create([
+            LikeCounter(content_type_id=row['content_type_id'], object_id=row['object_id'], shard=0,
+                        count=row['total'])
+            for row in actual_like_counts().iterator()], batch_size=5000)
+    return LikeCounter.objects.count()
+
+
+def stale_like_counts():
+    """(content_type_id, object_id, stored, actual) of the objects whose counter is wrong."""
+    stored = (LikeCounter.objects.values('content_type_id', 'object_id').order_by()
+              .annotate(total=Sum('count')))
+    stored = {(row['content_type_id'], row['object_id']): row['total'] for row in stored.iterator()}
+    stale = []
+    for row in actual_like_counts().iterator():
+        key = (row['content_type_id'], row['object_id'])
+        count = stored.pop(key, 0)
+        if count != row['total']:
+            stale.append((*key, count, row['total']))
+    stale += [(*key, total, 0) for key, total in stored.items() if total]
+    return stale
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from likes.counters import rebuild_like_counts, stale_like_counts
+
+
+class Command(BaseCommand):
+    help = ('Rebuild (or with --verify, check) the like counters from the likes. Run it when no '
+            'web process is buffering likes, their pending deltas would be counted twice.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='only report objects whose stored like count is wrong')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = stale_like_counts()
+            for content_type_id, object_id, stored, actual in stale[:100]:
+                self.stdout.write(f'content type {content_type_id} object {object_id}: '
+                                  f'stored {stored} likes, actual {actual}')
+            if stale:
+                raise CommandError(f'{len(stale)} object(s) have a stale like count.')
+            self.stdout.write(self.style.SUCCESS('All like counts are correct.'))
+            return
+
+        counters = rebuild_like_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {counters} like counter(s).'))
@@ -1,12 +1,43 @@
+from django.conf import settings
 from django.db import models
-from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+def content_type_id(model):
+    # ContentTypeManager caches get_for_model, only the first call queries
+    return ContentType.objects.get_for_model(model).id
+
 
 class Likes(models.Model):
-	user = models.ForeignKey(User, on_delete=models.CASCADE)
-	content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)	
-	object_id = models.PositiveIntegerField()
-	content_object = GenericForeignKey()
\ No newline at end of file
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'content_type', 'object_id'], name='likes_unique_user_object'),
+        ]
+        indexes = [
+            # rebuilding and verifying the counters group the likes by object
+            models.Index(fields=['content_type', 'object_id'], name='likes_object_idx'),
+        ]
+
+
+class LikeCounter(models.Model):
+    """Like count of an object, spread over a few rows (shards).
+
+    Buffered increments are written to a random shard, so concurrent flushes
+    for a popular object rarely wait on the same row lock. The count is the
+    sum of the shards.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'shard'], name='likes_counter_unique_shard'),
+        ]
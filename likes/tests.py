@@ -1,3 +1,53 @@
-from django.test import TestCase
+import os
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from store.models import Collection, Product
+
+from .buffer import LikeBuffer, like_buffer
+
+
+class LikeBufferTests(SimpleTestCase):
+    def test_pending_deltas_are_flushed_without_further_adds(self):
+        flushed = threading.Event()
+        buffer = LikeBuffer(interval=0.05)
+        with mock.patch('likes.buffer.write_deltas', side_effect=lambda deltas: flushed.set()) as write_deltas:
+            try:
+                buffer.add(7, 1, 1)
+                buffer.add(7, 1, 1)
+                self.assertTrue(flushed.wait(5))
+            finally:
+                buffer.flusher_pid = None
+        [(content_type_id, object_id, shard, delta)], = write_deltas.call_args.args
+        self.assertEqual((content_type_id, object_id, delta), (7, 1, 2))
+        self.assertEqual(buffer.pending_delta(7, 1), 0)
+
+
+class LikeTests(APITestCase):
+    def setUp(self):
+        # no flusher thread, it would write outside of the test's transaction
+        patcher = mock.patch.object(like_buffer, 'flusher_pid', os.getpid())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_like_and_unlike_a_product(self):
+        collection = Collection.objects.create(title='Coffee')
+        product = Product.objects.create(title='Coffee', description='beans', slug='coffee', price=10,
+                                         inventory=100, collection=collection)
+        url = reverse('products-like', args=[product.pk])
+        self.client.force_authenticate(get_user_model().objects.create_user('jane', 'jane@example.com', 'x'))
+        # the buffer gets the deltas once the request's transaction commits
+        for attempt in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(self.client.put(url).json()['liked'])
+        self.assertEqual(self.client.get(url).json(), {'liked': True, 'likes': 1})
+        like_buffer.flush()
+        self.assertEqual(self.client.get(url).json(), {'liked': True, 'likes': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+        self.assertEqual(self.client.get(url).json(), {'liked': False, 'likes': 0})
@@ -1,3 +1,31 @@
-from django.shortcuts import render
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
 
-# Create your views here.
+from . import counters
+from .models import content_type_id
+
+
+class LikeMixin:
+    """`like` detail action: GET the count, PUT to like, DELETE to unlike.
+
+    PUT and DELETE are idempotent and answer with the state after the request.
+    """
+
+    @action(detail=True, methods=['GET', 'PUT', 'DELETE'], permission_classes=[IsAuthenticatedOrReadOnly])
+    def like(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        type_id = content_type_id(queryset.model)
+        # only the primary key is needed, the object itself is never serialized
+        object_id = get_object_or_404(queryset.prefetch_related(None).values_list('pk', flat=True),
+                                      pk=kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if request.method == 'PUT':
+            counters.like(request.user, type_id, object_id)
+            liked = True
+        elif request.method == 'DELETE':
+            counters.unlike(request.user, type_id, object_id)
+            liked = False
+        else:
+            liked = counters.is_liked(request.user, type_id, object_id)
+        return Response({'liked': liked, 'likes': counters.like_count(type_id, object_id)})
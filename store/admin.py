@@ -1,9 +1,54 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .catalog import STREAMING_FORMATS, feed_format, import_catalog
 from .models import Product, Collection, Customer, Order, Promotion, Cart, CartItem
 
 
+class CatalogImportForm(forms.Form):
+    feed = forms.FileField(help_text=f'{", ".join(STREAMING_FORMATS)} or any format tablib reads. Columns: '
+                                     'slug, title, description, price, inventory, collection, promotions.')
+    create_collections = forms.BooleanField(required=False)
+    dry_run = forms.BooleanField(required=False, help_text='Validate the feed and roll everything back.')
+
+
 class AdminProduct(admin.ModelAdmin):
     prepopulated_fields = ({"slug": ("title",)})
+    change_list_template = 'admin/store/product/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='store_product_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect('admin:store_product_changelist')
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            feed = form.cleaned_data['feed']
+            result = import_catalog(feed, feed_format(feed.name), dry_run=form.cleaned_data['dry_run'],
+                                    create_collections=form.cleaned_data['create_collections'])
+            summary = result.as_dict()
+            self.message_user(request, (
+                f"{'Dry run: ' if form.cleaned_data['dry_run'] else ''}{summary['rows']} rows in "
+                f"{summary['seconds']}s ({summary['rows_per_second']} rows/s), {summary['created']} created, "
+                f"{summary['updated']} updated, {summary['errors']} rejected."),
+                messages.WARNING if result.errors else messages.SUCCESS)
+            if not result.errors:
+                return redirect('admin:store_product_changelist')
+            errors = result.errors[:200]
+        else:
+            errors = []
+        return TemplateResponse(request, 'admin/store/product/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import products',
+            'form': form,
+            'errors': errors,
+        })
 
 
 admin.site.register(Product, AdminProduct)
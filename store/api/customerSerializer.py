@@ -1,8 +1,9 @@
 from store.models import Customer
+from store.api.sparse import SparseFieldsMixin
 from rest_framework import serializers
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_id = serializers.IntegerField(read_only=True)
 
     class Meta:
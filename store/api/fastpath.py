@@ -0,0 +1,260 @@
+import copy
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from ..profiling import serializing
+
+# ============================= fast read-only list path ========================
+# list actions fetch their rows with values() and turn every dict into the
+# response through a row function compiled once per serializer, instead of
+# hydrating model instances and walking the DRF fields of every row. Anything
+# the compiler does not understand falls back to the regular serializer, so the
+# output is always the one `serializer.data` would produce.
+FAST_LIST = getattr(settings, 'STORE_FAST_LIST', True)
+
+# fields whose to_representation returns database values unchanged
+IDENTITY_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.BooleanField,
+    serializers.FloatField,
+)
+
+_plans = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _is_identity(field):
+    return any(type(field).to_representation is cls.to_representation for cls in IDENTITY_FIELDS)
+
+
+def _resolve(model, source):
+    """values() path and model field of a serializer source, following forward FKs."""
+    parts = source.split('.')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise Unsupported(source)
+        if field.is_relation and part != field.name:
+            # `user_id` reads the raw column of the foreign key
+            if index < len(parts) - 1:
+                raise Unsupported(source)
+            return '__'.join(parts), field.target_field
+        if index < len(parts) - 1:
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                raise Unsupported(source)
+            model = field.related_model
+    return '__'.join(parts), field
+
+
+class RowPlan:
+    """Columns to fetch and the compiled row function of one serializer."""
+
+    def __init__(self, model):
+        self.model = model
+        self.pk = model._meta.pk.attname
+        self.values = {self.pk: self.pk}
+        self.many = []
+        self.children = []
+        self.batched = []
+        self.converters = {}
+
+    def column(self, path):
+        self.values[path] = path
+        return path
+
+    def converter(self, convert):
+        name = f'c{len(self.converters)}'
+        self.converters[name] = convert
+        return name
+
+    def compile_serializer(self, serializer, model, prefix=''):
+        items = []
+        annotated = getattr(getattr(serializer, 'Meta', None), 'annotated_fields', ())
+        for field in serializer._readable_fields:
+            items.append(f'{field.field_name!r}: {self.compile_field(field, model, prefix, annotated)}')
+        return '{' + ', '.join(items) + '}'
+
+    def compile_field(self, field, model, prefix, annotated):
+        if isinstance(field, serializers.SerializerMethodField):
+            # method fields that only return the annotation of the same name
+            if prefix or field.field_name not in annotated:
+                raise Unsupported(field.field_name)
+            return f'row[{self.column(field.field_name)!r}]'
+        if hasattr(field, 'batch_representation'):
+            # fields that load the values of a whole page at once, e.g. tags
+            if prefix:
+                raise Unsupported(field.field_name)
+            self.batched.append((field.field_name, copy.deepcopy(field)))
+            return f'row[{field.field_name!r}]'
+        if field.source == '*':
+            raise Unsupported(field.field_name)
+
+        path, model_field = _resolve(model, field.source)
+        key = self.column(prefix + path)
+        if isinstance(field, ManyRelatedField):
+            if prefix or not model_field.many_to_many or not model_field.concrete:
+                raise Unsupported(field.field_name)
+            if type(field.child_relation) is not PrimaryKeyRelatedField or field.child_relation.pk_field:
+                raise Unsupported(field.field_name)
+            del self.values[key]
+            self.many.append((key, model_field))
+            return f'row[{key!r}]'
+        if isinstance(field, serializers.ListSerializer):
+            # reverse foreign keys, e.g. order.items, are loaded by `rows()`
+            if prefix or not model_field.one_to_many:
+                raise Unsupported(field.field_name)
+            del self.values[key]
+            self.children.append((key, RowPlan(model_field.related_model).build(field.child),
+                                  model_field.field.attname))
+            return f'row[{key!r}]'
+        if isinstance(field, serializers.BaseSerializer):
+            if not (model_field.many_to_one or model_field.one_to_one):
+                raise Unsupported(field.field_name)
+            nested = self.compile_serializer(field, model_field.related_model, f'{prefix}{path}__')
+            return f'(None if row[{key!r}] is None else {nested})'
+        if isinstance(field, PrimaryKeyRelatedField):
+            if type(field) is not PrimaryKeyRelatedField or field.pk_field:
+                raise Unsupported(field.field_name)
+            return f'row[{key!r}]'
+        if model_field.is_relation:
+            raise Unsupported(field.field_name)
+        if _is_identity(field):
+            return f'row[{key!r}]'
+        # an unbound copy, the plan outlives the request the serializer was built for
+        convert = self.converter(copy.deepcopy(field).to_representation)
+        return f'(None if row[{key!r}] is None else {convert}(row[{key!r}]))'
+
+    def build(self, serializer):
+        body = self.compile_serializer(serializer, self.model)
+        source = f'def to_row(row):\n    return {body}\n'
+        namespace = dict(self.converters)
+        exec(compile(source, f'<row function of {type(serializer).__name__}>', 'exec'), namespace)
+        self.source = source
+        self.to_row = namespace['to_row']
+        return self
+
+    def values_queryset(self, queryset, extra=()):
+        # prefetches cannot run on dicts, many-to-many fields are loaded by `rows()`
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys([*self.values, *extra, *queryset.query.annotations]))
+
+    def rows(self, rows):
+        rows = list(rows)
+        pks = [row[self.pk] for row in rows]
+        for key, model_field in self.many:
+            self.attach(rows, key, self.many_related(model_field, pks))
+        for key, field in self.batched:
+            self.attach(rows, key, field.batch_representation(self.model, pks))
+        for key, plan, fk in self.children:
+            self.attach(rows, key, plan.related_rows(fk, pks))
+        return [self.to_row(row) for row in rows]
+
+    async def arows(self, rows):
+        # `rows()` through the async ORM, for store.asyncviews
+        rows = list(rows)
+        pks = [row[self.pk] for row in rows]
+        for key, model_field in self.many:
+            self.attach(rows, key, await self.amany_related(model_field, pks))
+        for key, field in self.batched:
+            self.attach(rows, key, await field.abatch_representation(self.model, pks))
+        for key, plan, fk in self.children:
+            self.attach(rows, key, await plan.arelated_rows(fk, pks))
+        return [self.to_row(row) for row in rows]
+
+    def attach(self, rows, key, related):
+        for row in rows:
+            row[key] = related.get(row[self.pk], [])
+
+    def related_queryset(self, fk, pks):
+        return self.values_queryset(
+            self.model._default_manager.filter(**{f'{fk}__in': pks}).order_by(self.pk), [fk])
+
+    def related_rows(self, fk, pks):
+        rows = list(self.related_queryset(fk, pks))
+        return self.group_rows(fk, rows, self.rows(rows))
+
+    async def arelated_rows(self, fk, pks):
+        rows = [row async for row in self.related_queryset(fk, pks)]
+        return self.group_rows(fk, rows, await self.arows(rows))
+
+    def group_rows(self, fk, rows, rendered_rows):
+        related = {}
+        for row, rendered in zip(rows, rendered_rows):
+            related.setdefault(row[fk], []).append(rendered)
+        return related
+
+    def many_related_queryset(self, model_field, pks):
+        through = model_field.remote_field.through
+        source, target = model_field.m2m_field_name(), model_field.m2m_reverse_field_name()
+        return through.objects.filter(**{f'{source}__in': pks}).order_by(target).values_list(source, target)
+
+    def many_related(self, model_field, pks):
+        related = {}
+        for pk, related_pk in self.many_related_queryset(model_field, pks):
+            related.setdefault(pk, []).append(related_pk)
+        return related
+
+    async def amany_related(self, model_field, pks):
+        related = {}
+        async for pk, related_pk in self.many_related_queryset(model_field, pks):
+            related.setdefault(pk, []).append(related_pk)
+        return related
+
+
+def row_plan(serializer, queryset):
+    """RowPlan for a (many=False) serializer instance, None when it cannot be compiled."""
+    annotated = getattr(getattr(serializer, 'Meta', None), 'annotated_fields', ())
+    key = (type(serializer), queryset.model, tuple(serializer.fields),
+           tuple(name for name in annotated if name in queryset.query.annotations))
+    if key not in _plans:
+        if any(name not in queryset.query.annotations for name in annotated if name in serializer.fields):
+            # the method field would compute the value itself
+            return None
+        try:
+            _plans[key] = RowPlan(queryset.model).build(serializer)
+        except Unsupported:
+            _plans[key] = None
+    return _plans[key]
+
+
+class FastListMixin:
+    """Serve list actions through a compiled row function, see `row_plan`."""
+    fast_list = FAST_LIST
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        plan = row_plan(self.get_serializer(), queryset)
+        if plan is None:
+            # ListModelMixin.list on the queryset filtered above
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        queryset = plan.values_queryset(queryset, self.get_fast_list_extra_fields())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with serializing():
+                rows = plan.rows(page)
+            return self.get_paginated_response(rows)
+        with serializing():
+            return Response(plan.rows(queryset))
+
+    def get_fast_list_extra_fields(self):
+        # row values the paginator keys on
+        fields = ['id']
+        if hasattr(self, 'get_sparse_required_fields'):
+            fields += sorted(self.get_sparse_required_fields())
+        return fields
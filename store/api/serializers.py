@@ -1,10 +1,15 @@
 from django.db.models import Sum
 
-from store.models import Product, Collection, Review, Cart, CartItem
+from store.cart import add_cart_item, add_cart_items, cart_total, merge_cart_items, missing_products
+from store.models import Product, Collection, Review, Cart, CartItem, Order, OrderItem
+from store.inventory import InsufficientStock
+from store.orders import EmptyCart, place_order
+from store.api.sparse import SparseFieldsMixin
 from rest_framework import serializers
+from tags.serializers import TagsField
 
 
-class CollectionSerializers(serializers.ModelSerializer):
+class CollectionSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Collection
         fields = ['id', 'title', 'product_count']
@@ -13,14 +18,17 @@ class CollectionSerializers(serializers.ModelSerializer):
     product_count = serializers.IntegerField(read_only=True)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
-        read_only_fields = ['id', 'last_update']
+        exclude = ['search_vector']
+        # effective_price is the price after the best promotion, see store.pricing
+        read_only_fields = ['id', 'last_update', 'effective_price']
 
+    tags = TagsField()
 
-class ReviewSerializers(serializers.ModelSerializer):
+
+class ReviewSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'name', 'description', 'date']
@@ -42,11 +50,16 @@ class CartItemSerializers(serializers.ModelSerializer):
 
     # note if we want to not display all product fields in cart items seraizliser need to create new serializer in the fields specify  for example id title, description price, total price
     def get_total_price(self, cart_item: CartItem):
+        # annotated in SQL by store.cart.cart_items_queryset
+        if hasattr(cart_item, 'total_price'):
+            return cart_item.total_price
         return cart_item.quantity * cart_item.product.price
 
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity', 'total_price']
+        # method fields that return the queryset annotation as is (store.api.fastpath)
+        annotated_fields = ['total_price']
 
 
 class CartSerializers(serializers.ModelSerializer):
@@ -56,7 +69,10 @@ class CartSerializers(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField("get_total_price")
 
     def get_total_price(self, cart: Cart):
-        return sum([item.quantity * item.product.price for item in cart.items.all()])
+        # annotated in SQL by store.cart.carts_queryset
+        if hasattr(cart, 'total_price'):
+            return cart.total_price
+        return Cart.objects.filter(pk=cart.pk).aggregate(total_price=cart_total())['total_price']
 
     class Meta:
         model = Cart
@@ -66,26 +82,15 @@ class CartSerializers(serializers.ModelSerializer):
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError('No product with the given id was found.')
-        return value
-
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
-        try:
-
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            # update an exist items
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-
-            # create new cartItem
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
+        # existence check, insert and increment run as a single upsert statement
+        self.instance = add_cart_item(cart_id, product_id, quantity)
+        if self.instance is None:
+            raise serializers.ValidationError(
+                {'product_id': ['No product with the given id was found.']})
         return self.instance
 
     class Meta:
@@ -93,7 +98,86 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_id', 'quantity']
 
 
+class BulkAddCartItemListSerializer(serializers.ListSerializer):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', 500)
+        super().__init__(*args, **kwargs)
+
+    def validate(self, attrs):
+        # one IN query for every product of the request
+        missing = missing_products(list(merge_cart_items(attrs)))
+        if missing:
+            raise serializers.ValidationError(
+                {'product_id': [f'No product with the given id was found: {", ".join(map(str, missing))}.']})
+        return attrs
+
+    def create(self, validated_data):
+        add_cart_items(self.context['cart_id'], merge_cart_items(validated_data))
+        return validated_data
+
+
+class BulkAddCartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+    class Meta:
+        list_serializer_class = BulkAddCartItemListSerializer
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = SampleProductSerializer()
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product', 'unit_price', 'quantity']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+
+
+class OrderItemHistorySerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source='product.title', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product_id', 'title', 'unit_price', 'quantity']
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    # annotated with store.counters.order_total()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    items = OrderItemHistorySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'placed_at', 'payment_status', 'total', 'items']
+
+
+class CreateOrderSerializer(serializers.Serializer):
+    cart_id = serializers.UUIDField()
+
+    def validate_cart_id(self, value):
+        if not Cart.objects.filter(pk=value).exists():
+            raise serializers.ValidationError('No cart with the given id was found.')
+        return value
+
+    def save(self, **kwargs):
+        try:
+            return place_order(self.validated_data['cart_id'], self.context['customer'])
+        except EmptyCart:
+            raise serializers.ValidationError({'cart_id': ['The cart is empty.']})
+        except InsufficientStock as error:
+            raise serializers.ValidationError(
+                {'cart_id': [f'Not enough inventory for product(s): {", ".join(map(str, error.product_ids))}.']})
@@ -0,0 +1,75 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+# ============================= sparse fieldsets ========================
+# GET ?fields=id,title,price returns only those fields, ?exclude=description
+# drops some. The view side defers the model columns and skips the prefetches
+# that the remaining fields do not need.
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+def requested_fields(request):
+    """Return (fields or None, exclude) asked for by a read request."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    return (_split(request.query_params.get(FIELDS_PARAM)) or None,
+            _split(request.query_params.get(EXCLUDE_PARAM)))
+
+
+class SparseFieldsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, exclude = requested_fields(self.context.get('request'))
+        if fields is None and not exclude:
+            return
+        for name in list(self.fields):
+            if (fields is not None and name not in fields) or name in exclude:
+                self.fields.pop(name)
+
+
+def model_fields_for(serializer_fields, model):
+    """Names of the model fields the serializer fields read, None when it cannot tell."""
+    names = set()
+    for field in serializer_fields:
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            names.add(model._meta.get_field(field.source).name)
+        except FieldDoesNotExist:
+            # annotation or property, nothing to load for it
+            continue
+    return names
+
+
+class SparseQuerysetMixin:
+    # prefetch_related lookups or Prefetch objects, applied only when their field is serialized
+    prefetch_fields = []
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, exclude = requested_fields(self.request)
+        names = None
+        if fields is not None or exclude:
+            names = model_fields_for(self.get_serializer().fields.values(), queryset.model)
+        if names is not None:
+            names |= self.get_sparse_required_fields()
+            queryset = queryset.defer(*[
+                field.name for field in queryset.model._meta.concrete_fields
+                if not field.primary_key and field.name not in names])
+        return queryset.prefetch_related(*[
+            lookup for lookup in self.prefetch_fields
+            if names is None or getattr(lookup, 'prefetch_through', lookup).split('__')[0] in names])
+
+    def get_sparse_required_fields(self):
+        # columns pagination and ordering read from the rows themselves
+        required = set(getattr(self, 'ordering_fields', None) or [])
+        ordering = getattr(self.paginator, 'ordering', None) if self.paginator else None
+        if isinstance(ordering, str):
+            required.add(ordering.lstrip('-'))
+        return required
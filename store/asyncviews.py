@@ -0,0 +1,211 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from tags.models import TaggedItem
+
+from .api.fastpath import row_plan
+from .api.serializers import CartSerializers, CollectionSerializers, ProductSerializer
+from .cache import acached_data
+from .cart import carts_queryset
+from .filters import ProductFilter
+from .models import Cart, Collection, Product
+from .pagination import ProductKeysetPagination
+from .permissions import AsyncIsAdminOrReadOnly
+from .views import CollectionViewSet, ProductViewSet
+
+# ============================= async read endpoints ========================
+# under ASGI the hottest catalog reads run on the event loop with the async ORM
+# instead of holding a worker thread for the whole request. They return exactly
+# what the ViewSets return: anything they do not handle themselves (writes,
+# HEAD/OPTIONS, the browsable API, ?search=, ?page=, ?fields=, invalid filters,
+# missing rows...) is handed to the sync ViewSet action, which renders the
+# response or the error as usual. Under WSGI nothing changes, nor under ASGI
+# unless STORE_ASYNC_VIEWS is on.
+ASGI_URLCONF = getattr(settings, 'STORE_ASGI_URLCONF', 'config.asgi_urls')
+
+JSON_MEDIA_TYPES = {'*/*', 'application/*', 'application/json'}
+
+
+@sync_and_async_middleware
+def async_routes_middleware(get_response):
+    """Route requests served by the async handler through ASGI_URLCONF."""
+    # read when the handler loads its middleware, so override_settings() works
+    # for the clients created under it
+    if not iscoroutinefunction(get_response) or not getattr(settings, 'STORE_ASYNC_VIEWS', False):
+        return get_response
+
+    async def middleware(request):
+        request.urlconf = ASGI_URLCONF
+        return await get_response(request)
+    return middleware
+
+
+class Delegate(Exception):
+    """Raised by an async view to leave the request to the sync view."""
+
+
+def allowed_methods(view):
+    # what APIView._allowed_methods() reports for a ViewSet action
+    actions = dict(view.actions)
+    if 'get' in actions:
+        actions.setdefault('head', actions['get'])
+    return ', '.join(method.upper() for method in view.cls.http_method_names
+                     if method in actions or hasattr(view.cls, method))
+
+
+class AsyncReadView:
+    permission_classes = []
+    # query parameters the view handles itself
+    params = frozenset({'format'})
+    # CachedResponseMixin entries the view shares with its ViewSet
+    cache_prefix = None
+    cache_models = []
+
+    @classmethod
+    def as_view(cls):
+        async def view(request, *args, **kwargs):
+            return await cls().dispatch(request, *args, **kwargs)
+        view.cls = cls
+        # like every DRF view, CSRF is up to the authentication classes
+        return csrf_exempt(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        sync_view = resolve(request.path_info, urlconf=settings.ROOT_URLCONF).func
+        if self.handles(request):
+            api_request = Request(request, authenticators=[auth() for auth in
+                                                           api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            try:
+                await self.initial(api_request)
+                data, cache_status = await self.load(api_request, **kwargs)
+            except (Delegate, APIException):
+                # errors (an invalid cursor...) are rendered by the sync view
+                pass
+            else:
+                return self.render(data, sync_view, cache_status)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    def handles(self, request):
+        if request.method != 'GET' or not set(request.GET) <= self.params:
+            return False
+        if request.GET.get('format', 'json') != 'json':
+            return False
+        accept = request.META.get('HTTP_ACCEPT', '*/*')
+        return all(media_type.strip() in JSON_MEDIA_TYPES for media_type in accept.split(','))
+
+    async def initial(self, request):
+        # DRF authenticates every request up front, a bad token is a 401
+        if 'HTTP_AUTHORIZATION' in request.META:
+            try:
+                await sync_to_async(lambda: request.user)()
+            except APIException:
+                raise Delegate
+        for permission in self.permission_classes:
+            if not await permission().has_permission(request, self):
+                raise Delegate
+
+    async def load(self, request, **kwargs):
+        if self.cache_prefix is None:
+            return await self.get(request, **kwargs), None
+        return await acached_data(request, self.cache_prefix, self.cache_models,
+                                  lambda: self.get(request, **kwargs))
+
+    async def get(self, request, **kwargs):
+        raise NotImplementedError
+
+    def render(self, data, sync_view, cache_status):
+        response = HttpResponse(JSONRenderer().render(data), content_type=JSONRenderer.media_type)
+        if cache_status is not None:
+            response['X-Cache'] = cache_status
+        response['Allow'] = allowed_methods(sync_view)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class ProductListView(AsyncReadView):
+    permission_classes = [AsyncIsAdminOrReadOnly]
+    params = AsyncReadView.params | {'ordering', 'cursor', 'page_size', 'count', 'tag', 'collection_id',
+                                     'price__gt', 'price__lt', 'effective_price__gt', 'effective_price__lt'}
+    cache_prefix = 'products:list'
+    cache_models = ProductViewSet.cache_models
+    ordering_fields = ProductViewSet.ordering_fields
+
+    async def get(self, request):
+        queryset = await self.filter_queryset(request, Product.objects.all())
+        plan = row_plan(ProductSerializer(), queryset)
+        if plan is None:
+            raise Delegate
+        paginator = ProductKeysetPagination()
+        # the row values FastListMixin adds for the paginator
+        extra = ['id', *sorted({*self.ordering_fields, paginator.ordering.lstrip('-')})]
+        rows = await paginator.apaginate_queryset(plan.values_queryset(queryset, extra), request, self)
+        return paginator.get_paginated_response(await plan.arows(rows)).data
+
+    async def filter_queryset(self, request, queryset):
+        # ProductFilter without the two filters that query the database, which
+        # are applied below with the async ORM
+        data = request.query_params.copy()
+        collection_id = data.pop('collection_id', [''])[-1]
+        tag = data.pop('tag', [''])[-1]
+        filterset = ProductFilter(data, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            raise Delegate
+        queryset = filterset.qs
+        if collection_id:
+            try:
+                if not await Collection.objects.filter(pk=collection_id).aexists():
+                    raise Delegate
+            except (TypeError, ValueError, ValidationError):
+                raise Delegate
+            queryset = queryset.filter(collection_id=collection_id)
+        if tag:
+            queryset = queryset.filter(id__in=await TaggedItem.objects.aobject_ids_tagged(Product, tag))
+        return queryset
+
+
+class ProductDetailView(AsyncReadView):
+    permission_classes = [AsyncIsAdminOrReadOnly]
+    cache_prefix = 'products:retrieve'
+    cache_models = ProductViewSet.cache_models
+
+    async def get(self, request, pk):
+        queryset = Product.objects.all()
+        plan = row_plan(ProductSerializer(), queryset)
+        if plan is None:
+            raise Delegate
+        try:
+            row = await plan.values_queryset(queryset).aget(pk=pk)
+        except (Product.DoesNotExist, ValueError, ValidationError):
+            raise Delegate
+        return (await plan.arows([row]))[0]
+
+
+class CollectionListView(AsyncReadView):
+    permission_classes = [AsyncIsAdminOrReadOnly]
+    cache_prefix = 'collection:list'
+    cache_models = CollectionViewSet.cache_models
+
+    async def get(self, request):
+        queryset = Collection.objects.all()
+        plan = row_plan(CollectionSerializers(), queryset)
+        if plan is None:
+            raise Delegate
+        return await plan.arows([row async for row in plan.values_queryset(queryset, ['id'])])
+
+
+class CartDetailView(AsyncReadView):
+    async def get(self, request, pk):
+        try:
+            cart = await carts_queryset().aget(pk=pk)
+        except (Cart.DoesNotExist, ValueError, ValidationError):
+            raise Delegate
+        # items and total_price are loaded by carts_queryset, nothing left to query
+        return CartSerializers(cart).data
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_cache, new_version
+from .models import Customer
+
+# ============================= cached request user ========================
+# JWT requests load their user, and its customer, from the cache instead of the
+# database. Entries are keyed by user id and a per-user version that
+# store.signals bumps when the user (password included) or its customer
+# changes, so a request that read the database before a change can never
+# write its stale copy under the key that is read after it.
+USER_CACHE_TIMEOUT = getattr(settings, 'STORE_USER_CACHE_TIMEOUT', 60)
+
+
+def user_version_key(user_id):
+    return f'store:user:version:{user_id}'
+
+
+def get_user_version(user_id):
+    cache = get_cache()
+    key = user_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_version(user_id):
+    cache = get_cache()
+    key = user_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def get_cached_user(user_id):
+    """The user with its customer (or its absence) loaded, None when there is no such user."""
+    cache = get_cache()
+    key = f'store:user:{user_id}:{get_user_version(user_id)}'
+    user = cache.get(key)
+    if user is None:
+        User = get_user_model()
+        try:
+            user = User.objects.select_related('customer').get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            return None
+        cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_customer(user):
+    """The customer of a user, created on first use."""
+    try:
+        return user.customer
+    except Customer.DoesNotExist:
+        customer, created = Customer.objects.get_or_create(user_id=user.id)
+        return customer
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication serving the user from get_cached_user()."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
@@ -0,0 +1,560 @@
+import asyncio
+import json
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.db.models import Prefetch
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+from tags.models import Tag
+
+from .api.customerSerializer import CustomerSerializer
+from .api.fastpath import row_plan
+from .api.serializers import CartItemSerializers, CollectionSerializers, ProductSerializer, ReviewSerializers
+from .cart import cart_items_queryset
+from .db.pool import close_pool, connection_stats, reset_connection_stats
+from .models import Cart, CartItem, Collection, Customer, Product, Promotion, Review
+
+# ============================= store API benchmarks ========================
+# every scenario gets a BenchmarkContext and returns a callable that sends one
+# request through the full Django stack (in process, no network) and returns
+# the response.
+
+SCENARIOS = {}
+# what runs without the response cache, with override_settings(CACHES=NO_CACHE)
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def scenario(name):
+    def register(setup):
+        SCENARIOS[name] = setup
+        return setup
+    return register
+
+
+class BenchmarkContext:
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.client = Client(HTTP_HOST='localhost')
+        self.product_ids = list(Product.objects.values_list('id', flat=True)[:10000])
+        self.collection_ids = list(Collection.objects.values_list('id', flat=True)[:1000])
+        if not self.product_ids or not self.collection_ids:
+            raise ValueError('No products to benchmark against, run `manage.py seed_store` first.')
+        self._user_client = None
+        self._admin_client = None
+
+    def product_id(self):
+        return self.rng.choice(self.product_ids)
+
+    def collection_id(self):
+        return self.rng.choice(self.collection_ids)
+
+    def word(self):
+        return self.rng.choice(['coffee', 'organic', 'premium', 'garden', 'steel', 'travel'])
+
+    @property
+    def user_client(self):
+        if self._user_client is None:
+            customer = Customer.objects.select_related('user').first()
+            user = customer.user if customer else get_user_model().objects.first()
+            self._user_client = Client(HTTP_HOST='localhost',
+                                       HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+        return self._user_client
+
+    @property
+    def admin_client(self):
+        if self._admin_client is None:
+            user = get_user_model().objects.filter(is_superuser=True).first()
+            if user is None:
+                raise ValueError('No superuser to benchmark admin endpoints with, run `manage.py createsuperuser` first.')
+            self._admin_client = Client(HTTP_HOST='localhost',
+                                        HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+        return self._admin_client
+
+
+@scenario('product_list')
+def product_list(ctx):
+    url = reverse('products-list')
+    return lambda: ctx.client.get(url)
+
+
+@scenario('product_list_large')
+def product_list_large(ctx):
+    url = reverse('products-list')
+    return lambda: ctx.client.get(url, {'page_size': 100})
+
+
+@scenario('product_list_deep')
+def product_list_deep(ctx):
+    # follow the keyset cursor 20 pages deep, then start over
+    url = reverse('products-list')
+    state = {'next': url, 'pages': 0}
+
+    def request():
+        response = ctx.client.get(state['next'])
+        state['pages'] += 1
+        next_url = response.json().get('next')
+        state['next'] = next_url if next_url and state['pages'] < 20 else url
+        if state['next'] == url:
+            state['pages'] = 0
+        return response
+    return request
+
+
+@scenario('product_search')
+def product_search(ctx):
+    url = reverse('products-list')
+    return lambda: ctx.client.get(url, {'search': ctx.word()})
+
+
+@scenario('product_filter')
+def product_filter(ctx):
+    url = reverse('products-list')
+    return lambda: ctx.client.get(url, {'collection_id': ctx.collection_id(),
+                                        'price__gt': 10, 'price__lt': 500, 'ordering': 'price'})
+
+
+@scenario('product_tag_filter')
+def product_tag_filter(ctx):
+    labels = list(Tag.objects.values_list('label', flat=True)[:100])
+    if not labels:
+        raise ValueError('No tags to benchmark against, run `manage.py seed_store` first.')
+    url = reverse('products-list')
+    return lambda: ctx.client.get(url, {'tag': ctx.rng.choice(labels)})
+
+
+@scenario('product_detail')
+def product_detail(ctx):
+    return lambda: ctx.client.get(reverse('products-detail', args=[ctx.product_id()]))
+
+
+@scenario('product_reviews')
+def product_reviews(ctx):
+    # products with the most reviews, the deepest per-product keyset pages
+    product_ids = list(Product.objects.order_by('-review_count').values_list('id', flat=True)[:100])
+    return lambda: ctx.client.get(reverse('product-reviews-list', args=[ctx.rng.choice(product_ids)]),
+                                  {'page_size': 20})
+
+
+@scenario('collection_list')
+def collection_list(ctx):
+    url = reverse('collection-list')
+    return lambda: ctx.client.get(url)
+
+
+@scenario('cart_add')
+def cart_add(ctx):
+    cart = Cart.objects.create()
+    url = reverse('cart-items-list', args=[cart.pk])
+    return lambda: ctx.client.post(url, {'product_id': ctx.product_id(), 'quantity': 1})
+
+
+@scenario('cart_update')
+def cart_update(ctx):
+    cart = Cart.objects.create()
+    item = CartItem.objects.create(cart=cart, product_id=ctx.product_id(), quantity=1)
+    url = reverse('cart-items-detail', args=[cart.pk, item.pk])
+    return lambda: ctx.client.patch(url, json.dumps({'quantity': ctx.rng.randint(1, 9)}),
+                                    content_type='application/json')
+
+
+@scenario('product_like')
+def product_like(ctx):
+    # like and unlike the same product in turn, the buffered deltas cancel out
+    url = reverse('products-like', args=[ctx.product_ids[0]])
+    state = {'liked': False}
+
+    def request():
+        state['liked'] = not state['liked']
+        return ctx.user_client.put(url) if state['liked'] else ctx.user_client.delete(url)
+    return request
+
+
+@scenario('customer_me')
+def customer_me(ctx):
+    url = reverse('customer-me')
+    return lambda: ctx.user_client.get(url)
+
+
+@scenario('customer_history')
+def customer_history(ctx):
+    # customers with the most orders, first page and the one after it
+    customer_ids = list(Customer.objects.order_by('-order_count').values_list('id', flat=True)[:100])
+
+    def request():
+        response = ctx.admin_client.get(reverse('customer-history', args=[ctx.rng.choice(customer_ids)]),
+                                        {'page_size': 20})
+        next_url = response.json().get('next')
+        return ctx.admin_client.get(next_url) if next_url else response
+    return request
+
+
+# ============================= runner ========================
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(request, requests=200, warmup=20):
+    for _ in range(warmup):
+        request()
+    latencies, errors, counter = [], 0, QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(counter.queries / requests, 2),
+    }
+
+
+def run_benchmarks(names=None, requests=200, warmup=20, seed=None):
+    ctx = BenchmarkContext(seed)
+    results = {}
+    for name in names or SCENARIOS:
+        results[name] = run_scenario(SCENARIOS[name](ctx), requests, warmup)
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'products': Product.objects.count(),
+            'requests': requests,
+        },
+        'scenarios': results,
+    }
+
+
+def compare(results, baseline):
+    """Relative change against a baseline run, positive means slower (or fewer rps)."""
+    changes = {}
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        changes[name] = {
+            metric: round((current[metric] - previous[metric]) / previous[metric] * 100, 1)
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms') if previous[metric]
+        }
+        if previous['rps']:
+            changes[name]['rps'] = round((previous['rps'] - current['rps']) / previous['rps'] * 100, 1)
+    return changes
+
+
+# ============================= serializer throughput ========================
+# rows per second of the regular serializers against the fast list path
+# (store.api.fastpath), both including the query that loads the rows
+def serializer_querysets(cart):
+    return {
+        'products': (ProductSerializer, Product.objects.prefetch_related(
+            Prefetch('promotions', queryset=Promotion.objects.order_by('id'))).order_by('id')),
+        'collections': (CollectionSerializers, Collection.objects.order_by('id')),
+        'reviews': (ReviewSerializers, Review.objects.order_by('id')),
+        'customers': (CustomerSerializer, Customer.objects.order_by('id')),
+        'cart_items': (CartItemSerializers, cart_items_queryset().filter(cart=cart).order_by('id')),
+    }
+
+
+def best_of(rounds, function):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run_serializer_benchmarks(rows=1000, rounds=5):
+    cart = Cart.objects.create()
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1)
+        for product_id in Product.objects.order_by('id').values_list('id', flat=True)[:rows]])
+    results = {}
+    try:
+        for name, (serializer_class, queryset) in serializer_querysets(cart).items():
+            queryset = queryset[:rows]
+            plan = row_plan(serializer_class(), queryset)
+            regular_time, regular = best_of(rounds, lambda: serializer_class(queryset.all(), many=True).data)
+            fast_time, fast = best_of(rounds, lambda: plan.rows(plan.values_queryset(queryset.all())))
+            if json.dumps(regular, default=str) != json.dumps(fast, default=str):
+                raise AssertionError(f'{name}: the fast path output differs from {serializer_class.__name__}')
+            results[name] = {
+                'rows': len(fast),
+                'serializer_rows_per_s': round(len(fast) / regular_time),
+                'fast_rows_per_s': round(len(fast) / fast_time),
+                'speedup': round(regular_time / fast_time, 1),
+            }
+    finally:
+        cart.delete()
+    return results
+
+
+# ============================= concurrent HTTP load ========================
+# the scenarios above run one request at a time in process. These send
+# concurrent keep-alive requests over the network to running servers, e.g. the
+# ASGI application under uvicorn and the WSGI one under gunicorn, to compare
+# how each deployment holds up as concurrency grows.
+HTTP_SCENARIOS = {}
+
+
+def http_scenario(name):
+    def register(setup):
+        HTTP_SCENARIOS[name] = setup
+        return setup
+    return register
+
+
+@http_scenario('product_list')
+def http_product_list(ctx):
+    # a random price floor, so most pages miss the response cache
+    url = reverse('products-list')
+    return lambda: f'{url}?ordering=price&price__gt={ctx.rng.randint(0, 99999) / 100}'
+
+
+@http_scenario('product_detail')
+def http_product_detail(ctx):
+    return lambda: reverse('products-detail', args=[ctx.product_id()])
+
+
+@http_scenario('collection_list')
+def http_collection_list(ctx):
+    url = reverse('collection-list')
+    return lambda: url
+
+
+@http_scenario('cart_detail')
+def http_cart_detail(ctx):
+    cart = ctx.cart()
+    url = reverse('cart-detail', args=[cart.pk])
+    return lambda: url
+
+
+class HttpLoadContext(BenchmarkContext):
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.carts = []
+
+    def cart(self):
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([CartItem(cart=cart, product_id=product_id, quantity=1)
+                                      for product_id in self.rng.sample(self.product_ids, min(10, len(self.product_ids)))])
+        self.carts.append(cart)
+        return cart
+
+    def close(self):
+        for cart in self.carts:
+            cart.delete()
+
+
+async def http_get(reader, writer, host, path):
+    """(status, keep-alive) of one HTTP/1.1 GET on an open connection, the body is read and dropped."""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length, chunked, keep_alive = None, False, True
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value
+        elif name == 'connection':
+            keep_alive = value != 'close'
+    if chunked:
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+async def http_load(base_url, next_path, concurrency, duration):
+    parsed = urlsplit(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    prefix = parsed.path.rstrip('/')
+    latencies, errors = [], [0]
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        stream = None
+        while time.perf_counter() < deadline:
+            if stream is None:
+                stream = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            try:
+                status, keep_alive = await http_get(*stream, parsed.netloc, prefix + next_path())
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                errors[0] += 1
+                keep_alive = False
+            else:
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors[0] += 1
+            if not keep_alive:
+                stream[1].close()
+                stream = None
+        if stream is not None:
+            stream[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def run_http_benchmarks(targets, names=None, concurrency=(1, 16, 64), duration=10.0, warmup=2.0, seed=None):
+    """{target: {scenario: [results per concurrency level]}} for {name: base url} targets."""
+    ctx = HttpLoadContext(seed)
+    try:
+        scenarios = {name: HTTP_SCENARIOS[name](ctx) for name in names or HTTP_SCENARIOS}
+        results = {}
+        for target, base_url in targets.items():
+            results[target] = {}
+            for name, next_path in scenarios.items():
+                asyncio.run(http_load(base_url, next_path, max(concurrency), warmup))
+                results[target][name] = [asyncio.run(http_load(base_url, next_path, level, duration))
+                                         for level in concurrency]
+    finally:
+        ctx.close()
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'products': Product.objects.count(),
+            'duration': duration,
+            'targets': targets,
+        },
+        'targets': results,
+    }
+
+
+# ============================= database connections ========================
+# the in-process scenarios again, with the connection handling of a real server:
+# Django closes obsolete connections before and after every request. Each mode
+# patches the settings of the default connection for the duration of the run,
+# so the saving of persistent and pooled connections over a new connection per
+# request shows up in p50 and in the connect time per request.
+CONNECTION_MODES = {
+    'fresh': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': None},
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'pool': None},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'pool': {'min_size': 1, 'max_size': 4}},
+}
+CONNECTION_SCENARIOS = ('product_list', 'product_detail', 'collection_list', 'customer_me')
+
+
+def connection_mode(mode):
+    """Apply CONNECTION_MODES[mode] to the default connection, returns the undo callable."""
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+    saved_options = settings_dict['OPTIONS']
+    connection.close()
+    values = dict(CONNECTION_MODES[mode])
+    pool = values.pop('pool')
+    settings_dict.update(values)
+    settings_dict['OPTIONS'] = {key: value for key, value in saved_options.items() if key != 'pool'}
+    if pool:
+        settings_dict['OPTIONS']['pool'] = pool
+
+    def restore():
+        connection.close()
+        close_pool(connection.alias)
+        settings_dict.update(saved)
+        settings_dict['OPTIONS'] = saved_options
+    return restore
+
+
+def per_request_connections(request):
+    # what the request_started / request_finished signals do outside of the test client
+    def send():
+        close_old_connections()
+        try:
+            return request()
+        finally:
+            close_old_connections()
+    return send
+
+
+def run_connection_benchmarks(names=None, modes=None, requests=200, warmup=20, seed=None):
+    """{mode: {scenario: result}}, results also count connections opened and time spent connecting."""
+    if connection.vendor != 'postgresql':
+        raise ValueError(f'Connection pooling needs PostgreSQL, the default database is {connection.vendor}.')
+    ctx = BenchmarkContext(seed)
+    scenarios = {name: per_request_connections(SCENARIOS[name](ctx)) for name in names or CONNECTION_SCENARIOS}
+    results = {}
+    for mode in modes or CONNECTION_MODES:
+        restore = connection_mode(mode)
+        try:
+            results[mode] = {}
+            for name, request in scenarios.items():
+                for _ in range(warmup):
+                    request()
+                reset_connection_stats(connection.alias)
+                result = run_scenario(request, requests, warmup=0)
+                stats = connection_stats(connection.alias)
+                result.update({
+                    'connections_per_request': round(stats['opened'] / requests, 2),
+                    'checkouts_per_request': round(stats['checkouts'] / requests, 2),
+                    'connect_ms_per_request': round(stats['connect_ms'] / requests, 3),
+                    'checkout_ms_per_request': round(stats['checkout_ms'] / requests, 3),
+                    'wait_ms': stats['wait_ms'],
+                })
+                results[mode][name] = result
+        finally:
+            restore()
+    baseline = results.get('fresh', {})
+    for mode, scenarios_results in results.items():
+        for name, result in scenarios_results.items():
+            if name in baseline:
+                result['p50_saving_ms'] = round(baseline[name]['p50_ms'] - result['p50_ms'], 2)
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'host': connection.settings_dict['HOST'] or 'localhost',
+            'python': platform.python_version(),
+            'requests': requests,
+        },
+        'modes': results,
+    }
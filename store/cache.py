@@ -0,0 +1,138 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# ============================= versioned response cache ========================
+# every cached response key embeds the current version of the models it depends
+# on. Saving or deleting one of those models bumps its version, so all the old
+# keys stop being read at once and simply expire, nothing is deleted key by key.
+# Versions live in the cache itself, so every process must share one backend
+# (Redis, Memcached...) for a write in one worker to reach the others.
+
+CACHE_ALIAS = getattr(settings, 'STORE_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'STORE_CACHE_TIMEOUT', 60 * 5)
+
+HITS_KEY = 'store:response:hits'
+MISSES_KEY = 'store:response:misses'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_key(model):
+    return f'store:version:{model._meta.label_lower}'
+
+
+def new_version():
+    # start from the clock rather than 1 so an evicted counter can never come
+    # back with a version that old keys were written with
+    return int(time.time() * 1000)
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    # once the write is committed: a request reading the old rows in between
+    # would otherwise cache them under the new version
+    transaction.on_commit(lambda: _bump_version(model))
+
+
+def _bump_version(model):
+    cache = get_cache()
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def _incr_counter(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # first request, or a backend that stores nothing (DummyCache)
+        cache.add(key, 1, None)
+
+
+def get_stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': values.get(HITS_KEY, 0), 'misses': values.get(MISSES_KEY, 0)}
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def response_cache_key(request, prefix, models):
+    # the same filters in a different order must hit the same entry
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    query = urlencode([(key, value) for key, values in params for value in values])
+    versions = '.'.join(str(version) for version in get_versions(models))
+    raw = f'{request.get_host()}{request.path}?{query}'
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'store:response:{prefix}:{versions}:{digest}'
+
+
+class CachedResponseMixin:
+    # models whose save/delete must invalidate the cached responses of the view
+    cache_models = []
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_cache_key(request, f'{self.basename}:{self.action}', self.cache_models)
+        data = cache.get(key)
+        if data is not None:
+            _incr_counter(HITS_KEY)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _incr_counter(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+def _cached_lookup(request, prefix, models):
+    key = response_cache_key(request, prefix, models)
+    data = get_cache().get(key)
+    _incr_counter(MISSES_KEY if data is None else HITS_KEY)
+    return key, data
+
+
+async def acached_data(request, prefix, models, load):
+    """(data, 'HIT' or 'MISS') of an async view, sharing the entries of CachedResponseMixin."""
+    # the async methods of Django's cache backends each run the sync one in a
+    # thread, a single hop for the whole lookup is cheaper
+    key, data = await sync_to_async(_cached_lookup)(request, prefix, models)
+    if data is not None:
+        return data, 'HIT'
+    data = await load()
+    await sync_to_async(get_cache().set)(key, data, CACHE_TIMEOUT)
+    return data, 'MISS'
@@ -0,0 +1,171 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .inventory import release_carts
+from .models import Cart, CartItem, Product
+
+CART_MAX_AGE = getattr(settings, 'STORE_CART_MAX_AGE', timedelta(days=7))
+CART_SWEEP_BATCH_SIZE = getattr(settings, 'STORE_CART_SWEEP_BATCH_SIZE', 1000)
+
+# ============================= cart totals ========================
+# line and cart totals are computed by the database instead of multiplying
+# quantity * price over every hydrated product in Python
+TOTAL_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_total(prefix=''):
+    return ExpressionWrapper(F(f'{prefix}quantity') * F(f'{prefix}product__price'),
+                             output_field=TOTAL_FIELD)
+
+
+def cart_total():
+    return Coalesce(Sum(line_total('items__')), Value(Decimal(0)), output_field=TOTAL_FIELD)
+
+
+def cart_items_queryset():
+    return (CartItem.objects.select_related('product')
+            .only('id', 'cart_id', 'quantity',
+                  'product__title', 'product__description', 'product__price')
+            .annotate(total_price=line_total()))
+
+
+def carts_queryset():
+    return (Cart.objects.annotate(total_price=cart_total())
+            .prefetch_related(Prefetch('items', queryset=cart_items_queryset())))
+
+
+# ============================= cart item upsert ========================
+# `INSERT ... SELECT ... FROM product WHERE id = %s` only inserts when the product
+# exists, and `ON CONFLICT ... DO UPDATE` adds to the quantity already in the
+# cart, so validation, insert and increment are one atomic statement.
+UPSERT_SQL = '''
+    INSERT INTO {cartitem} (cart_id, product_id, quantity)
+    SELECT %s, {product}.id, %s FROM {product} WHERE {product}.id = %s
+    ON CONFLICT (cart_id, product_id)
+    DO UPDATE SET quantity = {cartitem}.quantity + excluded.quantity
+    RETURNING id, quantity
+'''
+
+BULK_UPSERT_SQL = '''
+    INSERT INTO {cartitem} (cart_id, product_id, quantity)
+    VALUES {values}
+    ON CONFLICT (cart_id, product_id)
+    DO UPDATE SET quantity = {cartitem}.quantity + excluded.quantity
+'''
+
+
+def _cart_item(pk, cart_id, product_id, quantity):
+    item = CartItem(id=pk, cart_id=cart_id, product_id=product_id, quantity=quantity)
+    item._state.adding = False
+    item._state.db = connection.alias
+    return item
+
+
+def supports_upsert():
+    return (connection.vendor in ('postgresql', 'sqlite') and
+            connection.features.can_return_columns_from_insert)
+
+
+def add_cart_item(cart_id, product_id, quantity):
+    """Add `quantity` of a product to a cart, returns None if the product does not exist."""
+    if not supports_upsert():
+        return _add_cart_item_locked(cart_id, product_id, quantity)
+
+    sql = UPSERT_SQL.format(cartitem=connection.ops.quote_name(CartItem._meta.db_table),
+                            product=connection.ops.quote_name(Product._meta.db_table))
+    db_cart_id = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [db_cart_id, quantity, product_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return _cart_item(row[0], cart_id, product_id, row[1])
+
+
+def _add_cart_item_locked(cart_id, product_id, quantity):
+    # other databases: same result with a row lock instead of a single statement
+    with transaction.atomic():
+        if not Product.objects.filter(pk=product_id).exists():
+            return None
+        item, created = CartItem.objects.select_for_update().get_or_create(
+            cart_id=cart_id, product_id=product_id, defaults={'quantity': quantity})
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity)
+            item.refresh_from_db(fields=['quantity'])
+    return item
+
+
+def merge_cart_items(items):
+    """Sum the quantities of repeated products, keeping the first-seen order."""
+    merged = {}
+    for item in items:
+        merged[item['product_id']] = merged.get(item['product_id'], 0) + item['quantity']
+    return merged
+
+
+def missing_products(product_ids):
+    found = set(Product.objects.filter(pk__in=product_ids).values_list('id', flat=True))
+    return [product_id for product_id in product_ids if product_id not in found]
+
+
+def add_cart_items(cart_id, quantities):
+    """Add {product_id: quantity} to a cart, all products must already be validated."""
+    if not quantities:
+        return
+    if not supports_upsert():
+        with transaction.atomic():
+            for product_id, quantity in quantities.items():
+                _add_cart_item_locked(cart_id, product_id, quantity)
+        return
+
+    db_cart_id = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+    rows = [(db_cart_id, product_id, quantity) for product_id, quantity in quantities.items()]
+    # stay under the bound parameter limit of the backend (999 on SQLite)
+    batch_size = (connection.features.max_query_params or 3000) // 3
+    cartitem = connection.ops.quote_name(CartItem._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            values = ', '.join(['(%s, %s, %s)'] * len(batch))
+            cursor.execute(BULK_UPSERT_SQL.format(cartitem=cartitem, values=values),
+                           [param for row in batch for param in row])
+
+
+# ============================= abandoned cart sweeper ========================
+# carts are deleted in primary key batches, each in its own short transaction,
+# so the cart tables are never locked for long
+def sweep_expired_carts(max_age=None, batch_size=None, dry_run=False):
+    cutoff = timezone.now() - (max_age or CART_MAX_AGE)
+    batch_size = batch_size or CART_SWEEP_BATCH_SIZE
+    expired = Cart.objects.filter(created_at__lt=cutoff).order_by('pk')
+    stats = {'carts': 0, 'items': 0, 'batches': 0}
+    started = time.monotonic()
+    last_pk = None
+    while True:
+        batch = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+        cart_ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not cart_ids:
+            break
+        last_pk = cart_ids[-1]
+        if dry_run:
+            stats['items'] += CartItem.objects.filter(cart_id__in=cart_ids).count()
+            stats['carts'] += len(cart_ids)
+        else:
+            with transaction.atomic():
+                release_carts(cart_ids)
+                deleted, per_model = Cart.objects.filter(pk__in=cart_ids).delete()
+            stats['items'] += per_model.get(CartItem._meta.label, 0)
+            stats['carts'] += per_model.get(Cart._meta.label, 0)
+        stats['batches'] += 1
+        if len(cart_ids) < batch_size:
+            break
+    stats['seconds'] = time.monotonic() - started
+    stats['rows_per_second'] = (stats['carts'] + stats['items']) / stats['seconds'] if stats['seconds'] else 0
+    return stats
@@ -0,0 +1,299 @@
+import csv
+import io
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.validators import validate_slug
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .counters import rebuild_product_counts
+from .models import Collection, Product, Promotion
+from .pricing import recompute_effective_prices
+from .search import get_search_backend
+
+IMPORT_BATCH_SIZE = getattr(settings, 'STORE_IMPORT_BATCH_SIZE', 5000)
+
+# ============================= catalog feeds ========================
+# a feed has one product per row: slug, title, description, price, inventory,
+# collection (title) and optionally promotions (ids separated by spaces, commas
+# or semicolons). CSV, NDJSON and XLSX are read row by row, other formats tablib
+# knows (xls, ods, json, yaml, tsv) are loaded in memory.
+STREAMING_FORMATS = ('csv', 'ndjson', 'xlsx')
+PRODUCT_COLUMNS = ('slug', 'title', 'description', 'price', 'inventory', 'collection_id')
+
+
+def feed_format(name):
+    extension = os.path.splitext(name)[1].lstrip('.').lower()
+    return {'jsonl': 'ndjson', 'txt': 'csv'}.get(extension, extension)
+
+
+def _header(names):
+    return [str(name or '').strip().lower() for name in names]
+
+
+def read_feed(file, format):
+    """Yield (line number, row dict) from a binary file object."""
+    if format == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        reader.fieldnames = _header(reader.fieldnames or [])
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'ndjson':
+        for line_number, line in enumerate(io.TextIOWrapper(file, encoding='utf-8'), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, {'_error': f'invalid JSON: {error}'}
+                continue
+            if not isinstance(row, dict):
+                yield line_number, {'_error': 'not a JSON object'}
+                continue
+            yield line_number, {str(key).lower(): value for key, value in row.items()}
+    elif format == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = _header(next(rows, []))
+            for line_number, values in enumerate(rows, 2):
+                if any(value is not None for value in values):
+                    yield line_number, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        import tablib
+        dataset = tablib.Dataset().load(file.read(), format=format)
+        header = _header(dataset.headers or [])
+        for line_number, values in enumerate(dataset, 2):
+            yield line_number, dict(zip(header, values))
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'errors': len(self.errors),
+            'seconds': round(self.elapsed, 2),
+            'rows_per_second': round(self.rows_per_second),
+        }
+
+
+class CatalogImporter:
+    """Upsert products by slug from a feed, one batch per transaction."""
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, create_collections=False, use_copy=None):
+        self.batch_size = batch_size
+        self.create_collections = create_collections
+        self.use_copy = connection.vendor == 'postgresql' if use_copy is None else use_copy
+        self.collections = {title.strip().lower(): pk
+                            for pk, title in Collection.objects.values_list('id', 'title')}
+        self.promotions = set(Promotion.objects.values_list('id', flat=True))
+        price = Product._meta.get_field('price')
+        self.max_price = Decimal(10) ** (price.max_digits - price.decimal_places)
+        self.price_places = Decimal(1).scaleb(-price.decimal_places)
+        self.min_inventory, self.max_inventory = connection.ops.integer_field_range(
+            Product._meta.get_field('inventory').get_internal_type())
+        self.max_lengths = {name: Product._meta.get_field(name).max_length for name in ('slug', 'title')}
+        self.max_lengths['collection'] = Collection._meta.get_field('title').max_length
+        self.result = ImportResult()
+        self.product_ids = set()
+
+    def run(self, rows):
+        started = time.monotonic()
+        batch = []
+        for line_number, row in rows:
+            self.result.rows += 1
+            try:
+                batch.append(self.clean(line_number, row))
+            except RowError as error:
+                self.result.errors.append((line_number, str(error)))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        self.finish()
+        self.result.elapsed = time.monotonic() - started
+        return self.result
+
+    # ============================= row validation ========================
+    def clean(self, line_number, row):
+        if '_error' in row:
+            raise RowError(row['_error'])
+        slug = str(row.get('slug') or '').strip()
+        title = str(row.get('title') or '').strip()
+        if not slug:
+            raise RowError('slug is required')
+        self.check_length('slug', slug)
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise RowError(f'invalid slug {slug!r}')
+        if not title:
+            raise RowError('title is required')
+        self.check_length('title', title)
+        try:
+            price = Decimal(str(row.get('price')).strip()).quantize(self.price_places)
+        except (InvalidOperation, ValueError):
+            raise RowError(f'invalid price {row.get("price")!r}')
+        # NaN passes quantize() but cannot be compared
+        if not price.is_finite():
+            raise RowError(f'invalid price {row.get("price")!r}')
+        if not 0 <= price < self.max_price:
+            raise RowError(f'price {price} out of range')
+        try:
+            # spreadsheets hand integers over as 10.0
+            inventory = Decimal(str(row.get('inventory')).strip())
+            if inventory != inventory.to_integral_value():
+                raise InvalidOperation
+            inventory = int(inventory)
+        except (InvalidOperation, OverflowError, ValueError):
+            raise RowError(f'invalid inventory {row.get("inventory")!r}')
+        if not self.min_inventory <= inventory <= self.max_inventory:
+            raise RowError(f'inventory {inventory} out of range')
+
+        collection = str(row.get('collection') or '').strip()
+        if not collection:
+            raise RowError('collection is required')
+        self.check_length('collection', collection)
+        collection_id = self.collections.get(collection.lower())
+        if collection_id is None:
+            if not self.create_collections:
+                raise RowError(f'unknown collection {collection!r}')
+            collection_id = self.collections[collection.lower()] = Collection.objects.create(title=collection).pk
+
+        promotions = row.get('promotions')
+        if promotions is not None:
+            if not isinstance(promotions, (list, tuple)):
+                promotions = str(promotions).replace(',', ' ').replace(';', ' ').split()
+            try:
+                promotions = {int(value) for value in promotions}
+            except (OverflowError, TypeError, ValueError):
+                raise RowError(f'invalid promotions {row["promotions"]!r}')
+            if promotions - self.promotions:
+                raise RowError(f'unknown promotion(s) {", ".join(map(str, sorted(promotions - self.promotions)))}')
+        return {'line': line_number, 'slug': slug, 'title': title,
+                'description': str(row.get('description') or ''), 'price': price,
+                'inventory': inventory, 'collection_id': collection_id, 'promotions': promotions}
+
+    def check_length(self, name, value):
+        if len(value) > self.max_lengths[name]:
+            raise RowError(f'{name} longer than {self.max_lengths[name]} characters')
+
+    # ============================= batch upsert ========================
+    def write(self, batch):
+        # the last row of a slug wins within a batch
+        rows = list({row['slug']: row for row in batch}.values())
+        with transaction.atomic():
+            existing = set(Product.objects.filter(slug__in=[row['slug'] for row in rows])
+                           .values_list('slug', flat=True))
+            ids = self.upsert_copy(rows) if self.use_copy else self.upsert_bulk(rows)
+            self.attach_promotions(rows, ids)
+        self.result.created += len(rows) - len(existing)
+        self.result.updated += len(existing)
+        self.product_ids.update(ids.values())
+
+    def upsert_bulk(self, rows):
+        Product.objects.bulk_create(
+            # effective_price is recomputed for every imported product in finish()
+            [Product(effective_price=row['price'], **{column: row[column] for column in PRODUCT_COLUMNS})
+             for row in rows],
+            update_conflicts=True, unique_fields=['slug'],
+            update_fields=[column for column in PRODUCT_COLUMNS if column != 'slug'] + ['last_update'])
+        return dict(Product.objects.filter(slug__in=[row['slug'] for row in rows]).values_list('slug', 'id'))
+
+    def upsert_copy(self, rows):
+        # COPY the batch into a temporary table, then one INSERT ... ON CONFLICT
+        table = connection.ops.quote_name(Product._meta.db_table)
+        staging = connection.ops.quote_name(f'{Product._meta.db_table}_import')
+        columns = ', '.join(connection.ops.quote_name(Product._meta.get_field(column).column)
+                            for column in PRODUCT_COLUMNS)
+        definitions = ', '.join(
+            f'{connection.ops.quote_name(Product._meta.get_field(column).column)} '
+            f'{Product._meta.get_field(column).db_type(connection)}'
+            for column in PRODUCT_COLUMNS)
+        buffer = io.StringIO()
+        # quoted, so an empty description is '' and not NULL
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows([[row[column] for column in PRODUCT_COLUMNS] for row in rows])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ({definitions}) ON COMMIT DROP')
+            cursor.execute(f'TRUNCATE {staging}')
+            copy = f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)'
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(copy, buffer)
+            else:
+                with raw.copy(copy) as writer:
+                    writer.write(buffer.getvalue())
+            updates = ', '.join(f'{name} = excluded.{name}' for name in
+                                [connection.ops.quote_name(Product._meta.get_field(column).column)
+                                 for column in PRODUCT_COLUMNS if column != 'slug'] + ['last_update'])
+            # the stored review stats have no database default
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}, last_update, effective_price, review_count) '
+                f'SELECT {columns}, %s, price, 0 FROM {staging} '
+                f'ON CONFLICT (slug) DO UPDATE SET {updates} RETURNING slug, id', [timezone.now()])
+            return dict(cursor.fetchall())
+
+    def attach_promotions(self, rows, ids):
+        # the promotions column replaces the promotions of its products
+        rows = [row for row in rows if row['promotions'] is not None]
+        if not rows:
+            return
+        Link = Product.promotions.through
+        product_ids = [ids[row['slug']] for row in rows]
+        Link.objects.filter(product_id__in=product_ids).delete()
+        Link.objects.bulk_create([
+            Link(product_id=ids[row['slug']], promotion_id=promotion_id)
+            for row in rows for promotion_id in sorted(row['promotions'])])
+
+    def finish(self):
+        # bulk writes skip the model signals, rebuild what they maintain
+        if not self.product_ids:
+            return
+        rebuild_product_counts()
+        backend = get_search_backend()
+        ids = sorted(self.product_ids)
+        for start in range(0, len(ids), self.batch_size):
+            with transaction.atomic():
+                recompute_effective_prices(ids[start:start + self.batch_size])
+                backend.index_products(ids[start:start + self.batch_size])
+        for model in (Product, Promotion):
+            bump_version(model)
+
+
+def import_catalog(file, format, dry_run=False, **options):
+    """Run a feed through CatalogImporter, rolled back when dry_run."""
+    rows = read_feed(file, format)
+    if not dry_run:
+        return CatalogImporter(**options).run(rows)
+    with transaction.atomic():
+        result = CatalogImporter(**options).run(rows)
+        transaction.set_rollback(True)
+    return result
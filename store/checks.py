@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import CACHE_ALIAS
+
+# cache backends that keep their entries in the process that wrote them
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_response_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'STORE_CACHE_ALIAS {CACHE_ALIAS!r} uses {backend.rsplit(".", 1)[-1]}, which is not shared between processes.',
+        hint='Cached responses and users of one worker are not invalidated by writes made in another, '
+             'use a shared backend such as Redis or Memcached.',
+        id='store.W001',
+    )]
@@ -0,0 +1,144 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import (Case, Count, DecimalField, F, IntegerField, Max, OuterRef, Q, QuerySet,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce
+
+from .cache import bump_version
+from .models import Collection, Customer, Order, OrderItem, Product, Review
+
+
+# ============================= Collection.product_count ========================
+def adjust_product_count(collection_id, delta):
+    Collection.objects.filter(pk=collection_id).update(
+        product_count=F('product_count') + delta)
+
+
+def actual_product_counts():
+    counts = (Product.objects.filter(collection=OuterRef('pk'))
+              .order_by().values('collection')
+              .annotate(count=Count('id')).values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def rebuild_product_counts():
+    # one UPDATE ... SET product_count = (SELECT COUNT(*) ...) for all collections
+    updated = Collection.objects.update(product_count=actual_product_counts())
+    bump_version(Collection)
+    return updated
+
+
+def stale_product_counts():
+    return (Collection.objects.annotate(actual_count=actual_product_counts())
+            .exclude(product_count=F('actual_count')))
+
+
+# ============================= Product.review_count / latest_review_date ========================
+def add_review(product_id, date):
+    newer = Q(latest_review_date__isnull=True) | Q(latest_review_date__lt=date)
+    Product.objects.filter(pk=product_id).update(
+        review_count=F('review_count') + 1,
+        latest_review_date=Case(When(newer, then=Value(date)), default=F('latest_review_date')))
+
+
+def remove_review(product_id):
+    # the latest date is read back through the (product, date, id) index
+    Product.objects.filter(pk=product_id).update(
+        review_count=F('review_count') - 1, latest_review_date=actual_latest_review_date())
+
+
+def _product_reviews():
+    return Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+
+def actual_review_count():
+    counts = _product_reviews().annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def actual_latest_review_date():
+    return Subquery(_product_reviews().annotate(latest=Max('date')).values('latest'))
+
+
+def rebuild_review_stats(batch_size=5000):
+    updated = 0
+    ids = Product.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while batch := list(ids.filter(id__gt=last_id)[:batch_size]):
+        updated += Product.objects.filter(pk__in=batch).update(
+            review_count=actual_review_count(), latest_review_date=actual_latest_review_date())
+        last_id = batch[-1]
+    bump_version(Product)
+    return updated
+
+
+def stale_review_stats():
+    # dates are compared through a sentinel so that NULL (no reviews) matches NULL
+    never = Value(date.min)
+    return (Product.objects.annotate(actual_count=actual_review_count(),
+                                     actual_latest=actual_latest_review_date())
+            .annotate(stored_since=Coalesce('latest_review_date', never),
+                      actual_since=Coalesce('actual_latest', never))
+            .filter(~Q(review_count=F('actual_count')) | ~Q(stored_since=F('actual_since'))))
+
+
+# ============================= Customer.order_count / lifetime_spend ========================
+SPEND_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def order_total():
+    """Sum of quantity * unit_price of the items of the order in OuterRef('pk')."""
+    totals = (OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+              .annotate(total=Sum(F('quantity') * F('unit_price'), output_field=SPEND_FIELD))
+              .values('total'))
+    return Coalesce(Subquery(totals, output_field=SPEND_FIELD), Value(Decimal(0)), output_field=SPEND_FIELD)
+
+
+def adjust_order_count(customer_id, delta):
+    Customer.objects.filter(pk=customer_id).update(order_count=F('order_count') + delta)
+
+
+def adjust_order_spend(customer_id, delta):
+    Customer.objects.filter(pk=customer_id).update(lifetime_spend=F('lifetime_spend') + delta)
+
+
+def order_customer(order_id):
+    # the customer of an order, resolved inside the UPDATE
+    return Subquery(Order.objects.filter(pk=order_id).values('customer_id')[:1])
+
+
+def actual_order_count():
+    counts = (Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+              .annotate(count=Count('id')).values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def actual_lifetime_spend():
+    spend = (OrderItem.objects.filter(order__customer=OuterRef('pk')).order_by().values('order__customer')
+             .annotate(total=Sum(F('quantity') * F('unit_price'), output_field=SPEND_FIELD))
+             .values('total'))
+    return Coalesce(Subquery(spend, output_field=SPEND_FIELD), Value(Decimal(0)), output_field=SPEND_FIELD)
+
+
+def refresh_order_summaries(customer_ids):
+    """Recompute the summary of some customers, `customer_ids` is a list or a queryset of ids."""
+    if not isinstance(customer_ids, QuerySet):
+        customer_ids = [pk for pk in customer_ids if pk is not None]
+    return Customer.objects.filter(pk__in=customer_ids).update(
+        order_count=actual_order_count(), lifetime_spend=actual_lifetime_spend())
+
+
+def rebuild_order_summaries(batch_size=5000):
+    updated = 0
+    ids = Customer.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while batch := list(ids.filter(id__gt=last_id)[:batch_size]):
+        updated += refresh_order_summaries(batch)
+        last_id = batch[-1]
+    return updated
+
+
+def stale_order_summaries():
+    return (Customer.objects.annotate(actual_count=actual_order_count(), actual_spend=actual_lifetime_spend())
+            .filter(~Q(order_count=F('actual_count')) | ~Q(lifetime_spend=F('actual_spend'))))
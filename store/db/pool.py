@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.db.utils import OperationalError
+
+# ============================= database connection pool ========================
+# one pool per database alias and process, shared by every thread (WSGI worker
+# threads, the per-request threads of ASGI, Celery task threads). A connection
+# is checked out when Django connects and goes back when Django closes it at the
+# end of the request or task, so CONN_MAX_AGE must be 0 with a pool. The stats
+# count every connection Django asks for, pooled or not, see connection_stats().
+
+_stats = {}
+_stats_lock = threading.Lock()
+_pools = {}
+_pools_lock = threading.Lock()
+# pools inherited through fork: their sockets belong to the parent process,
+# closing them here would end the parent's sessions, so they are only kept alive
+_inherited = []
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+def record(alias, **values):
+    with _stats_lock:
+        _stats.setdefault(alias, Counter()).update(values)
+
+
+def connection_stats(alias='default'):
+    """Checkouts, connections opened / closed and wait times of this process."""
+    with _stats_lock:
+        stats = Counter(_stats.get(alias, {}))
+    checkouts = stats['checkouts']
+    result = {
+        'checkouts': checkouts,
+        'opened': stats['opened'],
+        'closed': stats['closed'],
+        'waits': stats['waits'],
+        'timeouts': stats['timeouts'],
+        'failed_checks': stats['failed_checks'],
+        'checkout_ms': round(stats['checkout_ms'], 2),
+        'avg_checkout_ms': round(stats['checkout_ms'] / checkouts, 3) if checkouts else 0.0,
+        'wait_ms': round(stats['wait_ms'], 2),
+        'connect_ms': round(stats['connect_ms'], 2),
+    }
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        result.update(pool.gauges())
+    return result
+
+
+def reset_connection_stats(alias='default'):
+    with _stats_lock:
+        _stats.pop(alias, None)
+
+
+def get_pool(alias, options, check=None):
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != os.getpid():
+                if pool is not None:
+                    _inherited.append(pool)
+                pool = _pools[alias] = ConnectionPool(alias, check=check, **options)
+    return pool
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection = None
+
+    def give(self, connection):
+        self.connection = connection
+        self.event.set()
+
+
+class ConnectionPool:
+    """DB-API connections of one alias, reused LIFO so the warmest one goes first.
+
+    At most `max_size` connections are open at once, a checkout waits up to
+    `timeout` seconds for one to come back. Idle connections beyond `min_size`
+    are closed after `max_idle` seconds. `check(connection)` runs on every
+    connection taken from the idle list and must return False when it is broken.
+    """
+
+    def __init__(self, alias, min_size=0, max_size=10, timeout=10.0, max_idle=600.0, check=None):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size for {alias!r}: min_size={min_size}, max_size={max_size}.')
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._waiters = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def gauges(self):
+        with self._lock:
+            return {'pool_size': self._size, 'pool_idle': len(self._idle), 'pool_waiting': len(self._waiters),
+                    'pool_max_size': self.max_size}
+
+    def getconn(self, connect):
+        started = time.perf_counter()
+        while True:
+            connection, waited = self._checkout(started)
+            if waited:
+                record(self.alias, waits=1, wait_ms=(time.perf_counter() - started) * 1000)
+            if connection is None:
+                connect_started = time.perf_counter()
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                record(self.alias, opened=1, connect_ms=(time.perf_counter() - connect_started) * 1000)
+            elif self.check is not None and not self.check(connection):
+                record(self.alias, failed_checks=1)
+                self.discard(connection)
+                continue
+            record(self.alias, checkouts=1, checkout_ms=(time.perf_counter() - started) * 1000)
+            return connection
+
+    def _checkout(self, started):
+        # (idle connection or None for a free slot, whether the thread waited).
+        # Waiting threads are served first come, first served: connections and
+        # slots coming back are handed to the oldest waiter, not to whichever
+        # thread takes the lock first
+        with self._lock:
+            if not self._waiters:
+                if self._idle:
+                    return self._idle.pop()[0], False
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, False
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+        if waiter.event.wait(max(0.0, started + self.timeout - time.perf_counter())):
+            return waiter.connection, True
+        with self._lock:
+            if not waiter.event.is_set():
+                self._waiters.remove(waiter)
+                record(self.alias, timeouts=1, wait_ms=(time.perf_counter() - started) * 1000)
+                raise PoolTimeout(f'No connection to {self.alias!r} available after {self.timeout}s '
+                                  f'({self.max_size} in use).')
+        # handed over while timing out
+        return waiter.connection, True
+
+    def putconn(self, connection):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().give(connection)
+                return
+            self._idle.append((connection, now))
+            # the oldest idle connections sit at the left end
+            while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.popleft()[0])
+            self._size -= len(expired)
+        for connection in expired:
+            self._close(connection)
+
+    def discard(self, connection):
+        self._release_slot()
+        self._close(connection)
+
+    def _release_slot(self):
+        with self._lock:
+            if self._waiters:
+                # the waiter opens a new connection in the freed slot
+                self._waiters.popleft().give(None)
+            else:
+                self._size -= 1
+
+    def _close(self, connection):
+        record(self.alias, closed=1)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def close_pool(alias):
+    """Close the idle connections of the pool of `alias` and drop it."""
+    with _pools_lock:
+        pool = _pools.pop(alias, None)
+    if pool is None or pool.pid != os.getpid():
+        return
+    with pool._lock:
+        idle = [connection for connection, returned_at in pool._idle]
+        pool._idle.clear()
+        pool._size -= len(idle)
+    for connection in idle:
+        pool._close(connection)
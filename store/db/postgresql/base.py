@@ -0,0 +1,79 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+from ...profiling import record_connection
+from ..pool import get_pool, record
+
+# ============================= pooled PostgreSQL backend ========================
+# django.db.backends.postgresql with the connection pool of store.db.pool, set
+# up like the one of Django 5.1: OPTIONS = {'pool': {'min_size': ..., 'max_size':
+# ..., 'timeout': ...}} together with CONN_MAX_AGE = 0. Without 'pool' it is the
+# stock backend, only the connects are counted and timed.
+
+
+def check_connection(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        return False
+    # psycopg2 opened a transaction for the check
+    connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if not options:
+            return None
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured('Pooling doesn\'t support persistent connections.')
+        if options is True:
+            options = {}
+        check = check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        return get_pool(self.alias, options, check=check)
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        try:
+            pool = self.pool
+            if pool is None:
+                connection = super().get_new_connection(conn_params)
+                elapsed = (time.perf_counter() - started) * 1000
+                record(self.alias, checkouts=1, opened=1, checkout_ms=elapsed, connect_ms=elapsed)
+                return connection
+            connection = pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+            # what the stock get_new_connection() sets up on a fresh connection
+            self.isolation_level = base.IsolationLevel(
+                self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED))
+            return connection
+        finally:
+            record_connection(time.perf_counter() - started)
+
+    def _close(self):
+        pool = self.pool if self.connection is not None else None
+        if pool is None:
+            return super()._close()
+        connection = self.connection
+        if connection.closed or connection.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            pool.discard(connection)
+            return
+        try:
+            if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            pool.discard(connection)
+            return
+        pool.putconn(connection)
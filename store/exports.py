@@ -0,0 +1,165 @@
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .api.fastpath import row_plan
+
+# ============================= streaming exports ========================
+# GET /products/export/?format=csv streams every row the list endpoint would
+# return, without pagination. Rows come from a server-side cursor in chunks
+# and are rendered chunk by chunk, so memory stays flat whatever the row count.
+EXPORT_CHUNK_SIZE = getattr(settings, 'STORE_EXPORT_CHUNK_SIZE', 2000)
+
+
+class ExportRenderer(BaseRenderer):
+    # only used for content negotiation (?format= or Accept), the rows are
+    # written by the streaming response
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=JSONEncoder).encode(self.charset)
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_rows(serializer, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of rendered rows, the compiled row function when there is one."""
+    plan = row_plan(serializer, queryset)
+    if plan is not None:
+        for chunk in chunked(plan.values_queryset(queryset).iterator(chunk_size), chunk_size):
+            yield plan.rows(chunk)
+    else:
+        # prefetch_related runs once per chunk of the iterator
+        for chunk in chunked(queryset.iterator(chunk_size), chunk_size):
+            yield type(serializer)(chunk, many=True, context=serializer.context).data
+
+
+def ndjson_lines(chunks):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for rows in chunks:
+        yield ''.join(encoder.encode(row) + '\n' for row in rows)
+
+
+def csv_columns(serializer, prefix=''):
+    # nested serializers become `product.title` columns
+    columns = []
+    for field in serializer._readable_fields:
+        child = getattr(field, 'child', field)
+        if isinstance(child, serializers.BaseSerializer):
+            columns += csv_columns(child, f'{prefix}{field.field_name}.')
+        else:
+            columns.append(prefix + field.field_name)
+    return columns
+
+
+def flatten(row, prefix=''):
+    """Flat CSV rows of a rendered row, one per element of its nested lists."""
+    flat, nested = {}, []
+    for name, value in row.items():
+        key = prefix + name
+        if isinstance(value, dict):
+            flat.update(next(flatten(value, f'{key}.')))
+        elif isinstance(value, list) and value and isinstance(value[0], dict):
+            nested.append([flat_item for item in value for flat_item in flatten(item, f'{key}.')])
+        elif isinstance(value, list):
+            flat[key] = ' '.join(map(str, value))
+        else:
+            flat[key] = value
+    if not nested:
+        yield flat
+    # order.items: the order columns are repeated on each item row
+    for items in nested:
+        for item in items:
+            yield {**flat, **item}
+
+
+def csv_lines(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns, restval='', extrasaction='ignore')
+    writer.writeheader()
+    for rows in chunks:
+        for row in rows:
+            writer.writerows(flatten(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(request):
+    # `gzip;q=0` refuses it, `*` stands for every coding not listed
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, *params = coding.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class ExportMixin:
+    """`export` list action streaming the filtered queryset as NDJSON or CSV."""
+    export_chunk_size = EXPORT_CHUNK_SIZE
+
+    @action(detail=False, methods=['GET'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        serializer = self.get_serializer()
+        chunks = export_rows(serializer, queryset, self.export_chunk_size)
+
+        renderer = request.accepted_renderer
+        if renderer.format == 'csv':
+            lines = csv_lines(chunks, csv_columns(serializer))
+        else:
+            lines = ndjson_lines(chunks)
+
+        compress = accepts_gzip(request)
+        response = StreamingHttpResponse(gzipped(lines) if compress else (line.encode('utf-8') for line in lines),
+                                         content_type=f'{renderer.media_type}; charset=utf-8')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        filename = f'{self.basename}-{timezone.now():%Y%m%d-%H%M%S}.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -1,13 +1,21 @@
-from django_filters.rest_framework import FilterSet
+from django_filters.rest_framework import CharFilter, FilterSet
 
+from tags.models import TaggedItem
 
 from . models import Product
 
 
 class ProductFilter(FilterSet):
+    tag = CharFilter(method='filter_tag')
+
     class Meta:
         model = Product
         fields = {
             'collection_id': ['exact'],
-            'price': ['gt', 'lt']
+            'price': ['gt', 'lt'],
+            'effective_price': ['gt', 'lt'],
         }
+
+    def filter_tag(self, queryset, name, value):
+        # id IN (tagged object ids), served by the (tag, content_type, object_id) index
+        return queryset.filter(id__in=TaggedItem.objects.object_ids_tagged(Product, value))
@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import CartItem, Product, Reservation
+
+RESERVATION_TTL = getattr(settings, 'STORE_RESERVATION_TTL', timedelta(minutes=15))
+RELEASE_BATCH_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+# ============================= stock updates ========================
+# every change of Product.inventory or of the reservations holding it happens
+# with the products locked in primary key order, so concurrent checkouts,
+# reservations and releases serialize per product and never deadlock.
+def lock_products(product_ids, *fields):
+    return list(Product.objects.select_for_update()
+                .filter(pk__in=product_ids).order_by('pk')
+                .values_list('id', *fields))
+
+
+def decrement_inventory(quantities):
+    """Take {product_id: quantity} out of stock, all or nothing."""
+    if not quantities:
+        return
+    in_stock = Q()
+    for pk, quantity in quantities.items():
+        in_stock |= Q(pk=pk, inventory__gte=quantity)
+    updated = Product.objects.filter(in_stock).update(inventory=Case(
+        *[When(pk=pk, then=F('inventory') - quantity) for pk, quantity in quantities.items()],
+        default=F('inventory')))
+    if updated != len(quantities):
+        raise InsufficientStock(sorted(quantities))
+
+
+def increment_inventory(quantities):
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(inventory=Case(
+        *[When(pk=pk, then=F('inventory') + quantity) for pk, quantity in quantities.items()],
+        default=F('inventory')))
+
+
+def move_stock(wanted, held, inventory):
+    """Change the stock taken out of inventory from `held` to `wanted` ({product_id: quantity})."""
+    take, give = {}, {}
+    for pk in wanted.keys() | held.keys():
+        delta = wanted.get(pk, 0) - held.get(pk, 0)
+        if delta > 0:
+            take[pk] = delta
+        elif delta < 0:
+            give[pk] = -delta
+    short = [pk for pk, quantity in take.items() if inventory.get(pk, 0) < quantity]
+    if short:
+        raise InsufficientStock(sorted(short))
+    decrement_inventory(take)
+    increment_inventory(give)
+    if take or give:
+        # inventory changed through update(), which sends no signals
+        bump_version(Product)
+
+
+def lock_cart_stock(cart_id, wanted, *fields):
+    """Lock the products a cart wants or holds, returns (locked rows, held quantities)."""
+    reservations = Reservation.objects.filter(cart_id=cart_id)
+    held_ids = set(reservations.values_list('product_id', flat=True))
+    rows = lock_products(wanted.keys() | held_ids, *fields)
+    # read again under the locks, releases may have run in between
+    return rows, dict(reservations.values_list('product_id', 'quantity'))
+
+
+# ============================= reservations ========================
+def reserve_cart(cart_id, ttl=None):
+    """Hold the stock of every item of a cart until the returned expiry time."""
+    expires_at = timezone.now() + (ttl or RESERVATION_TTL)
+    with transaction.atomic():
+        wanted = dict(CartItem.objects.filter(cart_id=cart_id)
+                      .values_list('product_id', 'quantity'))
+        rows, held = lock_cart_stock(cart_id, wanted, 'inventory')
+        move_stock(wanted, held, dict(rows))
+        Reservation.objects.filter(cart_id=cart_id).delete()
+        Reservation.objects.bulk_create([
+            Reservation(cart_id=cart_id, product_id=pk, quantity=quantity, expires_at=expires_at)
+            for pk, quantity in wanted.items()
+        ])
+    return expires_at, wanted
+
+
+def release_reservations(reservations, batch_size=RELEASE_BATCH_SIZE):
+    """Give the stock held by a Reservation queryset back to inventory, in batches."""
+    released = 0
+    while True:
+        with transaction.atomic():
+            candidates = list(reservations.order_by('id')
+                              .values_list('id', 'product_id')[:batch_size])
+            if not candidates:
+                return released
+            lock_products({product_id for pk, product_id in candidates})
+            rows = list(reservations.select_for_update()
+                        .filter(id__in=[pk for pk, product_id in candidates])
+                        .values_list('id', 'product_id', 'quantity'))
+            quantities = {}
+            for pk, product_id, quantity in rows:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            increment_inventory(quantities)
+            Reservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+            if quantities:
+                bump_version(Product)
+        released += len(rows)
+        if len(candidates) < batch_size:
+            return released
+
+
+def release_carts(cart_ids, batch_size=RELEASE_BATCH_SIZE):
+    return release_reservations(Reservation.objects.filter(cart_id__in=cart_ids), batch_size)
+
+
+def release_expired(now=None, batch_size=RELEASE_BATCH_SIZE):
+    now = now or timezone.now()
+    return release_reservations(Reservation.objects.filter(expires_at__lte=now), batch_size)
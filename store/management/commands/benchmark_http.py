@@ -0,0 +1,99 @@
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import HTTP_SCENARIOS, run_http_benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Send concurrent requests to running servers and report rps and latency percentiles '
+            'per concurrency level, e.g. the ASGI application under uvicorn against the WSGI one. '
+            'Targets are NAME=URL, or use --serve to start uvicorn and gunicorn with the current settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*', metavar='NAME=URL',
+                            help='servers to benchmark, e.g. asgi=http://localhost:8001')
+        parser.add_argument('--scenario', action='append', choices=sorted(HTTP_SCENARIOS),
+                            help='scenario to run, repeat for several (default: all)')
+        parser.add_argument('--concurrency', type=int, action='append',
+                            help='concurrent connections, repeat for several levels (default: 1, 16, 64)')
+        parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario and level')
+        parser.add_argument('--warmup', type=float, default=2.0)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--serve', action='store_true',
+                            help='start `uvicorn config.asgi` and `gunicorn config.wsgi` (gthread) on local ports')
+        parser.add_argument('--workers', type=int, default=1, help='server processes with --serve')
+        parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker with --serve')
+        parser.add_argument('--port', type=int, default=8701, help='first port used with --serve')
+        parser.add_argument('--output', help='write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        targets = {}
+        for target in options['targets']:
+            name, separator, url = target.partition('=')
+            if not separator or not url.startswith('http://'):
+                raise CommandError(f'Expected NAME=http://host:port, got {target!r}.')
+            targets[name] = url
+        servers = self.serve(options, targets) if options['serve'] else []
+        if not targets:
+            raise CommandError('Nothing to benchmark, pass NAME=URL targets or --serve.')
+
+        try:
+            results = run_http_benchmarks(targets, options['scenario'], options['concurrency'] or (1, 16, 64),
+                                          options['duration'], options['warmup'], options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+        self.stdout.write(f"{'target':<10}{'scenario':<18}{'conc':>6}{'rps':>9}{'p50 ms':>9}"
+                          f"{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for target, scenarios in results['targets'].items():
+            for name, levels in scenarios.items():
+                for result in levels:
+                    self.stdout.write(f"{target:<10}{name:<18}{result['concurrency']:>6}{result['rps']:>9}"
+                                      f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+                                      f"{result['errors']:>8}")
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def serve(self, options, targets):
+        for module in ('uvicorn', 'gunicorn'):
+            if importlib.util.find_spec(module) is None:
+                raise CommandError(f'--serve needs {module}, `pip install {module}` or pass running servers as targets.')
+        asgi_port, wsgi_port = options['port'], options['port'] + 1
+        commands = {
+            'asgi': [sys.executable, '-m', 'uvicorn', 'config.asgi:application', '--host', '127.0.0.1',
+                     '--port', str(asgi_port), '--workers', str(options['workers']),
+                     '--no-access-log', '--log-level', 'warning'],
+            'wsgi': [sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--bind', f'127.0.0.1:{wsgi_port}',
+                     '--workers', str(options['workers']), '--threads', str(options['threads']),
+                     '--worker-class', 'gthread', '--log-level', 'warning'],
+        }
+        # the servers inherit DJANGO_SETTINGS_MODULE and the database of this process
+        servers = [subprocess.Popen(command, env=os.environ.copy()) for command in commands.values()]
+        for port in (asgi_port, wsgi_port):
+            self.wait_for(port, servers)
+        targets.update({'asgi': f'http://localhost:{asgi_port}', 'wsgi': f'http://localhost:{wsgi_port}'})
+        return servers
+
+    def wait_for(self, port, servers, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        for server in servers:
+            server.terminate()
+        raise CommandError(f'No server listening on port {port} after {timeout}s.')
@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from store.benchmarks import (CONNECTION_MODES, NO_CACHE, SCENARIOS, compare, run_benchmarks,
+                              run_connection_benchmarks, run_serializer_benchmarks)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the store API in process and report latency percentiles, rps and queries per request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help='scenario to run, repeat for several (default: all)')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--with-cache', action='store_true',
+                            help='keep the response cache enabled (measures cache hits)')
+        parser.add_argument('--output', help='write the results as JSON to this file')
+        parser.add_argument('--baseline', help='JSON results of a previous run to compare with')
+        parser.add_argument('--max-regression', type=float, default=None,
+                            help='fail when p95 or rps is worse than the baseline by more than this percentage')
+        parser.add_argument('--serializers', action='store_true',
+                            help='compare serializer throughput with the fast list path instead')
+        parser.add_argument('--rows', type=int, default=1000, help='rows per serializer run')
+        parser.add_argument('--connections', action='store_true',
+                            help='compare a new database connection per request with persistent and pooled ones')
+        parser.add_argument('--mode', action='append', choices=sorted(CONNECTION_MODES),
+                            help='connection mode with --connections, repeat for several (default: all)')
+
+    def handle(self, *args, **options):
+        if options['serializers']:
+            return self.serializers(options)
+        if options['connections']:
+            return self.connections(options)
+        if options['with_cache']:
+            results = self.run(options)
+        else:
+            with override_settings(CACHES=NO_CACHE):
+                results = self.run(options)
+
+        self.stdout.write(f"{'scenario':<20}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+        for name, result in results['scenarios'].items():
+            self.stdout.write(f"{name:<20}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                              f"{result['p99_ms']:>9}{result['queries_per_request']:>9}{result['errors']:>8}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                changes = compare(results, json.load(baseline))
+            regressions = []
+            for name, change in changes.items():
+                self.stdout.write(f'{name:<20}' + '  '.join(f'{metric} {value:+.1f}%' for metric, value in change.items()))
+                limit = options['max_regression']
+                if limit is not None and (change.get('p95_ms', 0) > limit or change.get('rps', 0) > limit):
+                    regressions.append(name)
+            if regressions:
+                raise CommandError(f'Regression over {options["max_regression"]}% in: {", ".join(regressions)}')
+
+    def run(self, options):
+        try:
+            return run_benchmarks(options['scenario'], options['requests'], options['warmup'], options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+    def serializers(self, options):
+        results = run_serializer_benchmarks(options['rows'])
+        self.stdout.write(f"{'serializer':<20}{'rows':>7}{'DRF rows/s':>12}{'fast rows/s':>13}{'speedup':>9}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<20}{result['rows']:>7}{result['serializer_rows_per_s']:>12}"
+                              f"{result['fast_rows_per_s']:>13}{result['speedup']:>8}x")
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'serializers': results}, output, indent=2)
+
+    def connections(self, options):
+        try:
+            with override_settings(CACHES=NO_CACHE):
+                results = run_connection_benchmarks(options['scenario'], options['mode'], options['requests'],
+                                                    options['warmup'], options['seed'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(f"{'mode':<12}{'scenario':<18}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'conn/req':>10}"
+                          f"{'connect ms':>12}{'checkout ms':>13}{'p50 saved':>11}")
+        for mode, scenarios in results['modes'].items():
+            for name, result in scenarios.items():
+                self.stdout.write(f"{mode:<12}{name:<18}{result['rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                                  f"{result['connections_per_request']:>10}{result['connect_ms_per_request']:>12}"
+                                  f"{result['checkout_ms_per_request']:>13}{result.get('p50_saving_ms', ''):>11}")
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,88 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.models import Cart, CartItem, Collection, Product
+from store.testing import assert_async_parity
+from tags.models import Tag
+
+
+class Command(BaseCommand):
+    help = ('Request the endpoints served by store.asyncviews through the ASGI and the WSGI '
+            'handler and fail when the responses differ in status, headers or body.')
+
+    # compared whether STORE_ASYNC_VIEWS is on or not, before it gets turned on
+    @override_settings(STORE_ASYNC_VIEWS=True)
+    def handle(self, *args, **options):
+        product = Product.objects.order_by('-review_count').first()
+        collection = Collection.objects.order_by('-product_count').first()
+        if product is None or collection is None:
+            raise CommandError('No products to compare, run `manage.py seed_store` first.')
+        tag = Tag.objects.filter(taggeditem__isnull=False).first()
+
+        products = reverse('products-list')
+        urls = [
+            products,
+            f'{products}?page_size=100&count=true',
+            f'{products}?ordering=price&page_size=50',
+            f'{products}?ordering=-effective_price&effective_price__gt=10&effective_price__lt=500',
+            f'{products}?collection_id={collection.pk}&page_size=100',
+            reverse('products-detail', args=[product.pk]),
+            f"{reverse('products-detail', args=[product.pk])}?format=json",
+            reverse('collection-list'),
+            # handed to the sync views
+            f'{products}?collection_id=0',
+            f'{products}?collection_id=abc',
+            f'{products}?price__gt=abc',
+            f'{products}?cursor=abc',
+            f'{products}?page=2',
+            f'{products}?search=coffee',
+            f'{products}?fields=id,title',
+            reverse('products-detail', args=[0]),
+            reverse('products-detail', args=['abc']),
+            reverse('cart-detail', args=[uuid.uuid4()]),
+            reverse('cart-detail', args=['abc']),
+        ]
+        if tag is not None:
+            urls.append(f'{products}?tag={tag.label}&page_size=100')
+        # the second page, through the cursor of the first
+        first = Client().get(products, {'ordering': 'price'}).json()
+        if first['next']:
+            urls.append(first['next'])
+
+        cart = Cart.objects.create()
+        try:
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=index + 1)
+                for index, product_id in enumerate(Product.objects.values_list('id', flat=True)[:20])])
+            urls.append(reverse('cart-detail', args=[cart.pk]))
+            failures = self.compare({}, urls)
+        finally:
+            cart.delete()
+
+        admin = get_user_model().objects.filter(is_staff=True).first()
+        if admin is not None:
+            failures += self.compare({'authorization': f'JWT {AccessToken.for_user(admin)}'}, [products])
+        failures += self.compare({'authorization': 'JWT invalid'}, [products])
+        failures += self.compare({'accept': 'text/csv'}, [products])
+
+        if failures:
+            raise CommandError(f'{len(failures)} response(s) differ.')
+        self.stdout.write(self.style.SUCCESS('ASGI responses are identical to WSGI.'))
+
+    def compare(self, headers, urls):
+        client, async_client = Client(), AsyncClient()
+        failures = []
+        for url in urls:
+            try:
+                response = assert_async_parity(client, async_client, url, headers=headers)
+            except AssertionError as error:
+                failures.append(url)
+                self.stderr.write(str(error))
+            else:
+                self.stdout.write(f'ok   {response.status_code} {url}')
+        return failures
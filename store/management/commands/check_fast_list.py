@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.models import Cart, CartItem, Collection, Product
+from store.testing import assert_fast_list_parity
+from tags.models import Tag
+
+
+class Command(BaseCommand):
+    help = ('Render the list endpoints through the fast path and through the serializers '
+            'and fail when the two responses are not byte for byte identical.')
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        product = Product.objects.annotate(reviews_count=Count('reviews')).order_by('-reviews_count').first()
+        collection = Collection.objects.order_by('-product_count').first()
+        if product is None or collection is None:
+            raise CommandError('No products to compare, run `manage.py seed_store` first.')
+        tag = Tag.objects.filter(taggeditem__isnull=False).first()
+
+        products = reverse('products-list')
+        urls = [
+            products,
+            f'{products}?page_size=100',
+            f'{products}?ordering=price&page_size=50',
+            f'{products}?ordering=-price&price__gt=10&price__lt=500',
+            f'{products}?collection_id={collection.pk}&page_size=100',
+            f'{products}?page=2',
+            f'{products}?search=coffee&page_size=50',
+            f'{products}?fields=id,title,price,promotions&page_size=100',
+            f'{products}?exclude=description,promotions',
+            f'{products}?fields=id,tags&page_size=100',
+            reverse('collection-list'),
+            f"{reverse('collection-list')}?fields=id,product_count",
+            reverse('product-reviews-list', args=[product.pk]),
+        ]
+        if tag is not None:
+            urls.append(f'{products}?tag={tag.label}&page_size=100')
+        failures = []
+
+        cart = Cart.objects.create()
+        try:
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=index + 1)
+                for index, product_id in enumerate(Product.objects.values_list('id', flat=True)[:20])])
+            urls.append(reverse('cart-items-list', args=[cart.pk]))
+            failures += self.compare(client, urls)
+        finally:
+            cart.delete()
+
+        admin = get_user_model().objects.filter(is_staff=True).first()
+        if admin is not None:
+            admin_client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(admin)}')
+            failures += self.compare(admin_client, [reverse('customer-list'),
+                                                    f"{reverse('customer-list')}?exclude=phone"])
+        else:
+            self.stdout.write('no staff user, skipping the customer list')
+
+        if failures:
+            raise CommandError(f'{len(failures)} list response(s) differ.')
+        self.stdout.write(self.style.SUCCESS('fast list output is identical to the serializers.'))
+
+    def compare(self, client, urls):
+        failures = []
+        for url in urls:
+            try:
+                response = assert_fast_list_parity(client, url)
+            except AssertionError as error:
+                failures.append(url)
+                self.stderr.write(str(error))
+            else:
+                self.stdout.write(f'ok   {response.status_code} {url}')
+        return failures
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.models import Cart, CartItem, Collection, Customer, Order, Product
+from store.testing import assert_index_scans
+from tags.models import Tag
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN every query of the hot store endpoints on PostgreSQL and fail when '
+            'one of them cannot use an index on the store or tags tables.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans are only checked on PostgreSQL.')
+        product = Product.objects.order_by('-review_count').first()
+        collection = Collection.objects.order_by('-product_count').first()
+        tag = Tag.objects.filter(taggeditem__isnull=False).first()
+        customer = Customer.objects.filter(order__isnull=False, user__is_staff=False).select_related('user').first()
+        if product is None or collection is None or tag is None:
+            raise CommandError('No products to check, run `manage.py seed_store` first.')
+
+        client = Client(HTTP_HOST='localhost')
+        products = reverse('products-list')
+        checks = [
+            (client, products),
+            (client, f'{products}?ordering=price'),
+            (client, f'{products}?ordering=-effective_price'),
+            (client, f'{products}?collection_id={collection.pk}'),
+            (client, f'{products}?collection_id={collection.pk}&price__gt=10&price__lt=500&ordering=price'),
+            (client, f'{products}?tag={tag.label}'),
+            (client, reverse('products-detail', args=[product.pk])),
+            (client, reverse('product-reviews-list', args=[product.pk])),
+        ]
+        if customer is not None:
+            user_client = Client(HTTP_HOST='localhost',
+                                 HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(customer.user)}')
+            checks.append((user_client, reverse('orders-list')))
+
+        failures = 0
+        cart = Cart.objects.create()
+        try:
+            CartItem.objects.bulk_create([CartItem(cart=cart, product_id=product_id, quantity=1)
+                                          for product_id in Product.objects.values_list('id', flat=True)[:5]])
+            checks += [(client, reverse('cart-detail', args=[cart.pk])),
+                       (client, reverse('cart-items-list', args=[cart.pk]))]
+            for check_client, url in checks:
+                failures += self.check_plan(url, lambda: check_client.get(url))
+        finally:
+            cart.delete()
+        failures += self.check_plan('pending orders', lambda: list(
+            Order.objects.filter(payment_status=Order.PAYMENT_STATUS_PENDING).order_by('placed_at')[:100]))
+
+        if failures:
+            raise CommandError(f'{failures} check(s) use a sequential scan.')
+        self.stdout.write(self.style.SUCCESS('Every hot query can use an index.'))
+
+    def check_plan(self, name, run):
+        try:
+            assert_index_scans(run)
+        except AssertionError as error:
+            self.stderr.write(f'FAIL {name}\n{error}\n')
+            return 1
+        self.stdout.write(f'ok   {name}')
+        return 0
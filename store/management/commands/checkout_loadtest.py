@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+
+from store.inventory import InsufficientStock, reserve_cart
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, Reservation
+from store.orders import place_order
+
+
+class Command(BaseCommand):
+    help = ('Fire parallel checkouts at a single product and verify that stock is '
+            'neither oversold nor lost. Meant for PostgreSQL, SQLite serializes writers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=300)
+        parser.add_argument('--workers', type=int, default=50)
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--quantity', type=int, default=1, help='units per cart')
+        parser.add_argument('--reserve', action='store_true',
+                            help='reserve the cart before placing the order')
+        parser.add_argument('--keep', action='store_true', help='keep the generated rows')
+
+    def handle(self, *args, **options):
+        checkouts, stock, quantity = options['checkouts'], options['stock'], options['quantity']
+        run = uuid4().hex[:8]
+        product, customers, carts = self.setup(run, checkouts, stock, quantity)
+        results = {'ordered': 0, 'sold_out': 0, 'errors': []}
+        lock = threading.Lock()
+        barrier = threading.Barrier(min(options['workers'], checkouts))
+
+        def checkout(index):
+            try:
+                if index < barrier.parties:
+                    barrier.wait()
+                if options['reserve']:
+                    reserve_cart(carts[index])
+                place_order(carts[index], customers[index])
+                outcome = 'ordered'
+            except InsufficientStock:
+                outcome = 'sold_out'
+            except Exception as error:
+                outcome = error
+            finally:
+                connections.close_all()
+            with lock:
+                if isinstance(outcome, Exception):
+                    results['errors'].append(repr(outcome))
+                else:
+                    results[outcome] += 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(checkout, range(checkouts)))
+        elapsed = time.monotonic() - started
+
+        try:
+            self.verify(product, carts, results, stock, quantity)
+            self.stdout.write(self.style.SUCCESS(
+                f'{checkouts} checkouts in {elapsed:.2f}s ({checkouts / elapsed:.0f}/s) on '
+                f'{connection.vendor}: {results["ordered"]} ordered, {results["sold_out"]} sold out, '
+                f'no oversell, no lost updates.'))
+        finally:
+            if not options['keep']:
+                self.cleanup(run, product, carts)
+
+    def setup(self, run, checkouts, stock, quantity):
+        User = get_user_model()
+        collection = Collection.objects.create(title=f'loadtest {run}')
+        product = Product.objects.create(
+            title=f'loadtest {run}', description='', slug=f'loadtest-{run}',
+            price=1, inventory=stock, collection=collection)
+        User.objects.bulk_create([
+            User(username=f'loadtest-{run}-{index}', email=f'loadtest-{run}-{index}@example.com')
+            for index in range(checkouts)])
+        users = User.objects.filter(username__startswith=f'loadtest-{run}-').order_by('id')
+        customers = Customer.objects.bulk_create([Customer(user=user) for user in users])
+        carts = Cart.objects.bulk_create([Cart() for index in range(checkouts)])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=quantity) for cart in carts])
+        return product, customers, [cart.pk for cart in carts]
+
+    def verify(self, product, carts, results, stock, quantity):
+        if results['errors']:
+            raise CommandError(f'{len(results["errors"])} checkout(s) failed: {results["errors"][:5]}')
+        product.refresh_from_db(fields=['inventory'])
+        sold = OrderItem.objects.filter(product=product).aggregate(sold=Sum('quantity'))['sold'] or 0
+        expected_orders = min(stock // quantity, len(carts))
+        problems = []
+        if product.inventory < 0:
+            problems.append(f'oversold: inventory is {product.inventory}')
+        if sold != results['ordered'] * quantity:
+            problems.append(f'{sold} units in order items for {results["ordered"]} orders')
+        if product.inventory + sold != stock:
+            problems.append(f'lost update: {product.inventory} left + {sold} sold != {stock}')
+        if results['ordered'] != expected_orders:
+            problems.append(f'{results["ordered"]} orders placed, expected {expected_orders}')
+        if Reservation.objects.filter(product=product).exists():
+            problems.append('reservations left behind')
+        if problems:
+            raise CommandError('; '.join(problems))
+
+    def cleanup(self, run, product, carts):
+        order_ids = list(OrderItem.objects.filter(product=product).values_list('order_id', flat=True))
+        OrderItem.objects.filter(product=product).delete()
+        Order.objects.filter(pk__in=order_ids).delete()
+        Reservation.objects.filter(product=product).delete()
+        Cart.objects.filter(pk__in=carts).delete()
+        Customer.objects.filter(user__username__startswith=f'loadtest-{run}-').delete()
+        get_user_model().objects.filter(username__startswith=f'loadtest-{run}-').delete()
+        collection = product.collection
+        product.delete()
+        collection.delete()
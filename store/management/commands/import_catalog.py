@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog import IMPORT_BATCH_SIZE, STREAMING_FORMATS, feed_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = ('Create or update products by slug from a CSV, NDJSON or XLSX feed '
+            '(columns: slug, title, description, price, inventory, collection, promotions).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', help=f'feed format, by default the file extension '
+                                             f'({", ".join(STREAMING_FORMATS)} are streamed)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--create-collections', action='store_true',
+                            help='create the collections missing from the database')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='use bulk_create(update_conflicts=True) on PostgreSQL too')
+        parser.add_argument('--dry-run', action='store_true', help='validate and roll everything back')
+        parser.add_argument('--errors', help='write the rejected rows as NDJSON to this file')
+
+    def handle(self, *args, **options):
+        format = options['format'] or feed_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as feed:
+                result = import_catalog(
+                    feed, format, dry_run=options['dry_run'], batch_size=options['batch_size'],
+                    create_collections=options['create_collections'],
+                    use_copy=False if options['no_copy'] else None)
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for line, message in result.errors[:20]:
+            self.stderr.write(f'line {line}: {message}')
+        if len(result.errors) > 20:
+            self.stderr.write(f'... and {len(result.errors) - 20} more')
+        if options['errors']:
+            with open(options['errors'], 'w') as output:
+                for line, message in result.errors:
+                    output.write(json.dumps({'line': line, 'error': message}) + '\n')
+
+        summary = result.as_dict()
+        self.stdout.write(self.style.SUCCESS(
+            f"{'dry run: ' if options['dry_run'] else ''}{summary['rows']} rows in {summary['seconds']}s "
+            f"({summary['rows_per_second']} rows/s): {summary['created']} created, "
+            f"{summary['updated']} updated, {summary['errors']} rejected"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.pricing import rebuild_effective_prices, stale_effective_prices
+
+
+class Command(BaseCommand):
+    help = 'Recompute (or with --verify, check) the stored Product.effective_price values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--verify', action='store_true',
+                            help='only report products whose stored effective price is wrong')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = list(stale_effective_prices().values_list('id', 'price', 'effective_price', 'actual_price')[:100])
+            for pk, price, stored, actual in stale:
+                self.stdout.write(f'product {pk}: price {price}, stored {stored}, actual {actual}')
+            if stale:
+                raise CommandError(f'{stale_effective_prices().count()} product(s) have a stale effective_price.')
+            self.stdout.write(self.style.SUCCESS('All effective prices are correct.'))
+            return
+
+        updated = rebuild_effective_prices(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed effective_price for {updated} product(s).'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.search import REBUILD_BATCH_SIZE, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.monotonic()
+        indexed = backend.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} product(s) with {type(backend).__name__} in {elapsed:.2f}s.'))
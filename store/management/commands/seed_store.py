@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from store.seed import Seeder
+
+
+class Command(BaseCommand):
+    help = 'Generate a large store dataset with bulk_create, for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', type=int, default=100)
+        parser.add_argument('--promotions', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help='random seed, for repeatable data')
+        parser.add_argument('--skip-search-index', action='store_true')
+
+    def handle(self, *args, **options):
+        seeder = Seeder(batch_size=options['batch_size'], seed=options['seed'], stdout=self.stdout)
+        seeder.seed(collections=options['collections'], promotions=options['promotions'],
+                    products=options['products'], customers=options['customers'],
+                    orders=options['orders'], reviews=options['reviews'], tags=options['tags'],
+                    index_search=not options['skip_search_index'])
+        self.stdout.write(self.style.SUCCESS('Seeding finished.'))
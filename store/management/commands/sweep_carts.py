@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from store.cart import CART_MAX_AGE, CART_SWEEP_BATCH_SIZE, sweep_expired_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned carts (and their items) in bounded primary-key batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float, default=CART_MAX_AGE.total_seconds() / 3600,
+                            help='delete carts created more than this many hours ago')
+        parser.add_argument('--batch-size', type=int, default=CART_SWEEP_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be deleted')
+
+    def handle(self, *args, **options):
+        stats = sweep_expired_carts(max_age=timedelta(hours=options['max_age_hours']),
+                                    batch_size=options['batch_size'],
+                                    dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['carts']} cart(s) and {stats['items']} item(s) in {stats['batches']} batch(es), "
+            f"{stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.counters import rebuild_order_summaries, stale_order_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --verify, check) the stored Customer.order_count and lifetime_spend values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--verify', action='store_true',
+                            help='only report customers whose stored order summary is wrong')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = list(stale_order_summaries().values_list(
+                'id', 'order_count', 'actual_count', 'lifetime_spend', 'actual_spend')[:100])
+            for pk, stored, actual, stored_spend, actual_spend in stale:
+                self.stdout.write(f'customer {pk}: stored {stored} orders ({stored_spend}), '
+                                  f'actual {actual} ({actual_spend})')
+            if stale:
+                raise CommandError(f'{stale_order_summaries().count()} customer(s) have a stale order summary.')
+            self.stdout.write(self.style.SUCCESS('All order summaries are correct.'))
+            return
+
+        updated = rebuild_order_summaries(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the order summary of {updated} customer(s).'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.counters import rebuild_product_counts, stale_product_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --verify, check) the stored Collection.product_count values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='only report collections whose stored count is wrong')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = list(stale_product_counts().values_list('id', 'title', 'product_count', 'actual_count'))
+            for pk, title, stored, actual in stale:
+                self.stdout.write(f'collection {pk} ({title}): stored {stored}, actual {actual}')
+            if stale:
+                raise CommandError(f'{len(stale)} collection(s) have a stale product_count.')
+            self.stdout.write(self.style.SUCCESS('All product counts are correct.'))
+            return
+
+        updated = rebuild_product_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product_count for {updated} collection(s).'))
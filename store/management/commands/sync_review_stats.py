@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.counters import rebuild_review_stats, stale_review_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --verify, check) the stored Product.review_count and latest_review_date values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--verify', action='store_true',
+                            help='only report products whose stored review stats are wrong')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            stale = list(stale_review_stats().values_list(
+                'id', 'review_count', 'actual_count', 'latest_review_date', 'actual_latest')[:100])
+            for pk, stored, actual, stored_latest, actual_latest in stale:
+                self.stdout.write(f'product {pk}: stored {stored} reviews (latest {stored_latest}), '
+                                  f'actual {actual} (latest {actual_latest})')
+            if stale:
+                raise CommandError(f'{stale_review_stats().count()} product(s) have stale review stats.')
+            self.stdout.write(self.style.SUCCESS('All review stats are correct.'))
+            return
+
+        updated = rebuild_review_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review stats for {updated} product(s).'))
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_product_count(apps, schema_editor):
+    Collection = apps.get_model('store', 'Collection')
+    Product = apps.get_model('store', 'Product')
+    counts = (Product.objects.filter(collection=OuterRef('pk'))
+              .order_by().values('collection')
+              .annotate(count=Count('id')).values('count'))
+    Collection.objects.update(product_count=Coalesce(
+        Subquery(counts, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_alter_customer_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_product_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:10
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+
+
+def fill_effective_price(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    discount_field = DecimalField(max_digits=5, decimal_places=4)
+    discounts = (Product.promotions.through.objects.filter(product_id=OuterRef('pk'))
+                 .order_by().values('product_id')
+                 .annotate(best=Max('promotion__discount')).values('best'))
+    discount = Least(Greatest(Cast(Coalesce(Subquery(discounts), Value(0.0)), discount_field),
+                              Value(0, discount_field)), Value(1, discount_field))
+    Product.objects.update(effective_price=Round(
+        F('price') * (Value(1, discount_field) - discount), 2,
+        output_field=DecimalField(max_digits=6, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=6, null=True),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=6),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_review_stats(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count'),
+                                       output_field=IntegerField()), Value(0)),
+        latest_review_date=Subquery(reviews.annotate(latest=Max('date')).values('latest')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='latest_review_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='store_review_product_date_idx'),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+from store.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('store', '0011_review_stats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['customer', 'placed_at', 'id'], name='store_order_customer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_status', 'P')), fields=['placed_at'], name='store_order_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['last_update', 'id'], name='store_product_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='store_product_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='store_product_eff_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['collection', 'price', 'id'], name='store_product_coll_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['collection', 'last_update', 'id'], name='store_product_coll_updated_idx'),
+        ),
+    ]
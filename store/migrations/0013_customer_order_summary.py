@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:16
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_summaries(apps, schema_editor):
+    Customer = apps.get_model('store', 'Customer')
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    spend_field = models.DecimalField(max_digits=12, decimal_places=2)
+    counts = (Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+              .annotate(count=Count('id')).values('count'))
+    spend = (OrderItem.objects.filter(order__customer=OuterRef('pk')).order_by().values('order__customer')
+             .annotate(total=Sum(F('quantity') * F('unit_price'), output_field=spend_field)).values('total'))
+    Customer.objects.update(
+        order_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)),
+        lifetime_spend=Coalesce(Subquery(spend, output_field=spend_field), Value(Decimal(0)),
+                                output_field=spend_field))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_spend',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from uuid import uuid4
@@ -11,13 +12,29 @@ class Promotion(models.Model):
     def __str__(self) -> str:
         return self.description
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # a new discount changes the effective price of the promoted products
+        instance._loaded_discount = instance.__dict__.get('discount')
+        return instance
+
 
 class Collection(models.Model):
     title = models.CharField(max_length=255)
+    # kept in sync by store.signals, rebuilt with `manage.py sync_product_counts`
+    product_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # a rename has to be pushed into the search index of its products
+        instance._loaded_title = instance.__dict__.get('title')
+        return instance
+
 
 class Product(models.Model):
     title = models.CharField(max_length=255)
@@ -29,10 +46,49 @@ class Product(models.Model):
         Collection, on_delete=models.CASCADE, related_name='products')
     last_update = models.DateTimeField(auto_now=True)
     promotions = models.ManyToManyField(Promotion)
+    # price after the best promotion discount, maintained by store.pricing
+    effective_price = models.DecimalField(max_digits=6, decimal_places=2, editable=False)
+    # kept in sync by store.signals, rebuilt with `manage.py sync_review_stats`
+    review_count = models.IntegerField(default=0, editable=False)
+    latest_review_date = models.DateField(null=True, editable=False)
+    # PostgreSQL full-text document, maintained by store.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # keyset pages of ProductViewSet: (ordering field, id), alone or
+        # after ?collection_id=
+        indexes = [
+            models.Index(fields=['last_update', 'id'], name='store_product_updated_idx'),
+            models.Index(fields=['price', 'id'], name='store_product_price_idx'),
+            models.Index(fields=['effective_price', 'id'], name='store_product_eff_price_idx'),
+            models.Index(fields=['collection', 'price', 'id'], name='store_product_coll_price_idx'),
+            models.Index(fields=['collection', 'last_update', 'id'], name='store_product_coll_updated_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored collection so a move can be detected on save
+        instance._loaded_collection_id = instance.__dict__.get('collection_id')
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+
+class ProductSearchTerm(models.Model):
+    # inverted index used by the search backend on databases without tsvector
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'product'], name='store_search_term_idx'),
+        ]
+
 
 class Customer(models.Model):
     MEMBERSHIP_BRONZE = 'B'
@@ -51,6 +107,9 @@ class Customer(models.Model):
 
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # maintained by place_order and the order signals, see store.counters
+    order_count = models.IntegerField(default=0, editable=False)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
 
     def __str__(self) -> str:
         return f"{self.user.first_name} {self.user.last_name}"
@@ -76,19 +135,41 @@ class Order(models.Model):
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # a reassigned order moves to the summary of its new customer
+        instance._loaded_customer_id = instance.__dict__.get('customer_id')
+        return instance
+
     class Meta:
         permissions = [
             ('cancel_order', 'can cancel order')
         ]
+        indexes = [
+            # a customer's orders newest first, and the pending orders queue
+            models.Index(fields=['customer', 'placed_at', 'id'], name='store_order_customer_idx'),
+            models.Index(fields=['placed_at'], condition=models.Q(payment_status='P'),
+                         name='store_order_pending_idx'),
+        ]
 
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.PROTECT)
+    order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name='items')
     product = models.ForeignKey(
         Product, on_delete=models.PROTECT, related_name='orderitems')
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the customer summary is adjusted by the difference on save
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        instance._loaded_unit_price = instance.__dict__.get('unit_price')
+        return instance
+
 
 class Address(models.Model):
     street = models.CharField(max_length=255)
@@ -116,6 +197,20 @@ class CartItem(models.Model):
         return self.product.title[0:100]
 
 
+class Reservation(models.Model):
+    # stock held for a cart, already taken out of Product.inventory. cart_id is
+    # not a foreign key: a deleted cart leaves its reservations behind to expire
+    # and be released instead of losing the stock they hold
+    cart_id = models.UUIDField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = [['cart_id', 'product']]
+
+
 class Review(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='reviews')
@@ -123,5 +218,17 @@ class Review(models.Model):
     description = models.TextField()
     date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # per-product keyset pages on (date, id)
+            models.Index(fields=['product', 'date', 'id'], name='store_review_product_date_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_product_id = instance.__dict__.get('product_id')
+        return instance
@@ -0,0 +1,38 @@
+from django.db import transaction
+
+from .counters import adjust_order_spend
+from .inventory import lock_cart_stock, move_stock
+from .models import Cart, CartItem, Order, OrderItem, Reservation
+
+
+class EmptyCart(Exception):
+    pass
+
+
+# ============================= order placement ========================
+# the number of queries does not depend on the number of items in the cart:
+# read the cart, lock its products, one conditional UPDATE for the stock, one
+# INSERT for the order, one bulk INSERT for its items, the customer summary
+# UPDATEs and the cart delete.
+def place_order(cart_id, customer):
+    with transaction.atomic():
+        quantities = dict(CartItem.objects.filter(cart_id=cart_id)
+                          .values_list('product_id', 'quantity'))
+        if not quantities:
+            raise EmptyCart()
+
+        # stock already reserved for the cart is used first, only the rest is
+        # taken from inventory
+        products, held = lock_cart_stock(cart_id, quantities, 'price', 'inventory')
+        move_stock(quantities, held, {pk: inventory for pk, price, inventory in products})
+        Reservation.objects.filter(cart_id=cart_id).delete()
+
+        order = Order.objects.create(customer=customer)
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=quantities[pk], unit_price=price)
+            for pk, price, inventory in products if pk in quantities
+        ])
+        # bulk_create skips the OrderItem signals that maintain the customer summary
+        adjust_order_spend(customer.pk, sum(item.quantity * item.unit_price for item in items))
+        Cart.objects.filter(pk=cart_id).delete()
+    return order
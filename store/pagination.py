@@ -1,5 +1,212 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 3
+
+
+# ============================= Keyset (cursor) pagination ========================
+# pages are selected with `WHERE (field, id) > (last_value, last_id)` instead of
+# OFFSET, so the cost of page N does not depend on N. `id` is always added as a
+# tie-breaker so rows sharing the same price / last_update are never skipped.
+class KeysetPagination(BasePagination):
+    page_size = 3
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # the total count is a full scan, clients must ask for it with ?count=true
+    count_query_param = 'count'
+    ordering_param = api_settings.ORDERING_PARAM
+    ordering = '-id'
+    ordering_fields = ['id']
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page, cursor = self.get_page_queryset(queryset, request, view)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.set_page(list(page), cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # the same page through the async ORM, see store.asyncviews
+        page, cursor = self.get_page_queryset(queryset, request, view)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.set_page([row async for row in page], cursor)
+
+    def get_page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        self.ordering_key = ('-' if self.descending else '') + self.field
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(queryset.model, cursor, reverse))
+        # fetch one extra row to know whether there is a page after this one
+        return queryset[:self.page_size + 1], cursor
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def set_page(self, rows, cursor):
+        reverse = bool(cursor and cursor['r'])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.rows = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        allowed = set(getattr(view, 'ordering_fields', None) or self.ordering_fields) | {'id'}
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            term = params.split(',')[0].strip()
+            if term.lstrip('-') in allowed:
+                return term.lstrip('-'), term.startswith('-')
+        # keep an ordering a filter backend chose (e.g. search relevance) when
+        # it is on an annotation we can key on
+        if queryset.query.order_by:
+            term = queryset.query.order_by[0]
+            if isinstance(term, str) and term.lstrip('-') in queryset.query.annotations:
+                return term.lstrip('-'), term.startswith('-')
+        return self.ordering.lstrip('-'), self.ordering.startswith('-')
+
+    def get_order_by(self, reverse):
+        prefix = '-' if self.descending != reverse else ''
+        if self.field == 'id':
+            return [prefix + 'id']
+        return [prefix + self.field, prefix + 'id']
+
+    def get_keyset_filter(self, model, cursor, reverse):
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        pk = cursor['id']
+        if self.field == 'id':
+            return Q(**{f'id__{lookup}': pk})
+        try:
+            value = model._meta.get_field(self.field).to_python(cursor['v'])
+        except FieldDoesNotExist:
+            # annotations (search rank) are stored in the cursor as plain numbers
+            try:
+                value = float(cursor['v'])
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return (Q(**{f'{self.field}__{lookup}': value}) |
+                Q(**{self.field: value, f'id__{lookup}': pk}))
+
+    # ============================= cursor encoding ========================
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            cursor = {'o': str(cursor['o']), 'v': cursor['v'],
+                      'id': int(cursor['id']), 'r': bool(cursor['r'])}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # values are encoded as strings or numbers, see encode_cursor()
+        if cursor['v'] is None or not isinstance(cursor['v'], (str, int, float)):
+            raise NotFound(self.invalid_cursor_message)
+        # a cursor only makes sense for the ordering it was created with
+        if cursor['o'] != self.ordering_key:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        value = self.get_row_value(row, self.field)
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = {'o': self.ordering_key, 'v': value,
+                   'id': self.get_row_value(row, 'id'), 'r': reverse}
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_row_value(self, row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.rows:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.rows:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductKeysetPagination(KeysetPagination):
+    ordering = '-last_update'
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    # newest first, served by the (product, date, id) index
+    ordering = '-date'
+    ordering_fields = ['date']
+
+
+class OrderHistoryKeysetPagination(KeysetPagination):
+    # newest first, served by the (customer, placed_at, id) index
+    page_size = 10
+    ordering = '-placed_at'
+    ordering_fields = ['placed_at']
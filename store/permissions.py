@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from rest_framework import permissions
 from rest_framework.permissions import DjangoModelPermissions
 
@@ -9,6 +10,17 @@ class IsAdminOrReadyOnly(permissions.BasePermission):
         return bool(request.user and request.user.is_staff)
 
 
+class AsyncIsAdminOrReadOnly(permissions.BasePermission):
+    """IsAdminOrReadyOnly for the async views of store.asyncviews."""
+
+    async def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        # authenticating may query the user, keep it off the event loop
+        user = await sync_to_async(lambda: request.user)()
+        return bool(user and user.is_staff)
+
+
 class FullDjangoModelPermission(DjangoModelPermissions):
     def __init__(self) -> None:
         super().__init__()
@@ -0,0 +1,66 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+
+from .cache import bump_version
+from .models import Product
+
+PRICE_FIELD = DecimalField(max_digits=6, decimal_places=2)
+DISCOUNT_FIELD = DecimalField(max_digits=5, decimal_places=4)
+
+
+# ============================= Product.effective_price ========================
+# the price after the best (largest) discount among the product's promotions,
+# discounts do not stack. Stored on the product so it can be filtered and
+# sorted on without joining the promotions of every row.
+def best_discount():
+    discounts = (Product.promotions.through.objects.filter(product_id=OuterRef('pk'))
+                 .order_by().values('product_id')
+                 .annotate(best=Max('promotion__discount')).values('best'))
+    discount = Coalesce(Subquery(discounts), Value(0.0))
+    # numeric, so the product stays numeric and can be rounded on PostgreSQL
+    return Least(Greatest(Cast(discount, DISCOUNT_FIELD), Value(0, DISCOUNT_FIELD)), Value(1, DISCOUNT_FIELD))
+
+
+def effective_price():
+    return Round(F('price') * (Value(1, DISCOUNT_FIELD) - best_discount()), 2, output_field=PRICE_FIELD)
+
+
+def product_best_discount(product_id):
+    return (Product.promotions.through.objects.filter(product_id=product_id)
+            .aggregate(best=Max('promotion__discount'))['best']) or 0.0
+
+
+def discounted_price(price, discount):
+    """effective_price() in Python, to set the value of a product being saved without reading it back."""
+    # the discount as numeric(5, 4) clamped to [0, 1], the price rounded half away from zero
+    discount = Decimal(repr(float(discount))).quantize(Decimal('0.0001'), ROUND_HALF_UP)
+    discount = min(max(discount, Decimal(0)), Decimal(1))
+    return (Decimal(str(price)) * (1 - discount)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def recompute_effective_prices(product_ids):
+    """One UPDATE for the given product ids (a list or a values_list queryset)."""
+    if isinstance(product_ids, (list, set, tuple)) and not product_ids:
+        return 0
+    updated = Product.objects.filter(pk__in=product_ids).update(effective_price=effective_price())
+    if updated:
+        bump_version(Product)
+    return updated
+
+
+def rebuild_effective_prices(batch_size=5000):
+    updated = 0
+    ids = Product.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while batch := list(ids.filter(id__gt=last_id)[:batch_size]):
+        updated += Product.objects.filter(pk__in=batch).update(effective_price=effective_price())
+        last_id = batch[-1]
+    bump_version(Product)
+    return updated
+
+
+def stale_effective_prices():
+    return (Product.objects.annotate(actual_price=effective_price())
+            .exclude(effective_price=F('actual_price')))
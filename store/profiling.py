@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# 'METHOD view name' -> maximum number of SQL queries, e.g. {'GET products-list': 4}
+QUERY_BUDGETS = getattr(settings, 'STORE_QUERY_BUDGETS', {})
+SERVER_TIMING = getattr(settings, 'STORE_SERVER_TIMING', settings.DEBUG)
+
+_current_profile = ContextVar('store_request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.route = None
+        self.method = None
+        self.status = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections = 0
+        self.connect_time = 0.0
+        self.serializer_time = 0.0
+        self.total_time = 0.0
+        self._serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    @property
+    def budget_key(self):
+        return f'{self.method} {self.route}'
+
+    @property
+    def budget(self):
+        return QUERY_BUDGETS.get(self.budget_key)
+
+    def as_dict(self):
+        return {
+            'route': self.route,
+            'method': self.method,
+            'status': self.status,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'connections': self.connections,
+            'connect_ms': round(self.connect_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'connect;dur={self.connect_time * 1000:.2f};desc="{self.connections} connections"',
+            f'serializer;dur={self.serializer_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+
+# ============================= serializer timing ========================
+# the time spent turning objects into primitives, measured around the outermost
+# serializer of the request only so nested ones are not counted twice. The
+# store views time their own serializers (SerializerTimingMixin) and the rows
+# of the fast list path, nothing else in the process is touched
+@contextmanager
+def serializing():
+    profile = _current_profile.get()
+    if profile is None or profile._serializing:
+        yield
+        return
+    profile._serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serializer_time += time.perf_counter() - started
+        profile._serializing = False
+
+
+def timed_serialization(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with serializing():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class SerializerTimingMixin:
+    """Count the `serializer.data` of the view's serializers as serializer time."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # `data` calls to_representation() once for the whole object or list
+        serializer.to_representation = timed_serialization(serializer.to_representation)
+        return serializer
+
+
+def record_connection(seconds):
+    # called by store.db.postgresql for every connection Django opens or checks
+    # out of the pool, wait time included
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.connections += 1
+        profile.connect_time += seconds
+
+
+def record_queries(stack, profile):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile.record_query))
+
+
+class ProfilingMiddleware:
+    """Record query count, DB, serializer and total time of every request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                record_queries(stack, profile)
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # the async ORM and delegated sync views run their queries in
+                # the thread sync_to_async keeps for the request, whose
+                # connections are not the ones of the event loop thread
+                await sync_to_async(record_queries)(stack, profile)
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    await sync_to_async(stack.pop_all().close)()
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    def finish(self, request, response, profile, started):
+        profile.total_time = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        profile.route = match.view_name if match else request.path
+        profile.method = request.method
+        profile.status = response.status_code
+        response.profile = profile
+
+        if SERVER_TIMING:
+            response['Server-Timing'] = profile.server_timing()
+        if profile.budget is not None and profile.queries > profile.budget:
+            logger.warning('query budget exceeded: %s', json.dumps(
+                {**profile.as_dict(), 'budget': profile.budget}))
+        else:
+            logger.info('request profile: %s', json.dumps(profile.as_dict()))
+        return response
@@ -0,0 +1,143 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import Collection, Product, ProductSearchTerm
+
+# ============================= product full-text search ========================
+# the indexed document is the product title (weight A), its description (B) and
+# the title of its collection (C), the same fields SearchFilter used to scan.
+
+REBUILD_BATCH_SIZE = 1000
+
+
+class SearchBackend:
+    rank_field = 'search_rank'
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_products(self, product_ids):
+        raise NotImplementedError
+
+    def index_collection(self, collection_id):
+        self.index_products(Product.objects.filter(collection_id=collection_id)
+                            .values_list('id', flat=True))
+
+    def rebuild(self, batch_size=REBUILD_BATCH_SIZE):
+        indexed = 0
+        ids = Product.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return indexed
+            with transaction.atomic():
+                self.index_products(batch)
+            indexed += len(batch)
+            last_id = batch[-1]
+
+
+class PostgresSearchBackend(SearchBackend):
+    config = 'english'
+
+    def document(self):
+        collection_title = Subquery(
+            Collection.objects.filter(pk=OuterRef('collection_id')).values('title')[:1])
+        return (SearchVector('title', weight='A', config=self.config) +
+                SearchVector('description', weight='B', config=self.config) +
+                SearchVector(collection_title, weight='C', config=self.config))
+
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, search_type='websearch', config=self.config)
+        # cast to double precision so the rank survives a round trip through a
+        # keyset cursor unchanged
+        return (queryset.filter(search_vector=search_query)
+                .annotate(**{self.rank_field: Cast(
+                    SearchRank(F('search_vector'), search_query), FloatField())})
+                .order_by(f'-{self.rank_field}', '-id'))
+
+    def index_products(self, product_ids):
+        Product.objects.filter(pk__in=list(product_ids)).update(search_vector=self.document())
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    weights = {'title': 3, 'description': 2, 'collection__title': 1}
+    token_pattern = re.compile(r'\w+')
+    max_term_length = ProductSearchTerm._meta.get_field('term').max_length
+
+    def tokenize(self, text):
+        return [token[:self.max_term_length]
+                for token in self.token_pattern.findall((text or '').lower())
+                if len(token) > 1]
+
+    def search(self, queryset, query):
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms:
+            return queryset
+        # products that contain every term, found through the (term, product) index
+        matches = (ProductSearchTerm.objects.filter(term__in=terms)
+                   .values('product_id')
+                   .annotate(matched=Count('term', distinct=True))
+                   .filter(matched=len(terms))
+                   .values('product_id'))
+        rank = (ProductSearchTerm.objects.filter(product=OuterRef('pk'), term__in=terms)
+                .order_by().values('product')
+                .annotate(rank=Sum('weight')).values('rank'))
+        return (queryset.filter(pk__in=matches)
+                .annotate(**{self.rank_field: Subquery(rank, output_field=IntegerField())})
+                .order_by(f'-{self.rank_field}', '-id'))
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        rows = Product.objects.filter(pk__in=product_ids).values_list(
+            'id', *self.weights)
+        terms = []
+        for product_id, *values in rows:
+            weights = {}
+            for weight, value in zip(self.weights.values(), values):
+                for token in self.tokenize(value):
+                    weights[token] = weights.get(token, 0) + weight
+            terms += [ProductSearchTerm(term=term, product_id=product_id, weight=min(weight, 32767))
+                      for term, weight in weights.items()]
+        ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchTerm.objects.bulk_create(terms, batch_size=REBUILD_BATCH_SIZE)
+
+    def rebuild(self, batch_size=REBUILD_BATCH_SIZE):
+        ProductSearchTerm.objects.all().delete()
+        return super().rebuild(batch_size)
+
+
+def get_search_backend():
+    backend = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over title, description and collection title.',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,161 @@
+import random
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from tags.models import Tag, TaggedItem
+
+from .cache import bump_version
+from .counters import rebuild_order_summaries, rebuild_product_counts, rebuild_review_stats
+from .models import Collection, Customer, Order, OrderItem, Product, Promotion, Review
+from .pricing import rebuild_effective_prices
+from .search import get_search_backend
+
+# ============================= bulk data generator ========================
+# rows are built in memory one batch at a time and written with bulk_create,
+# which skips the model signals, so the denormalized data is rebuilt at the end.
+
+WORDS = ('organic coffee tea beans roast ground whole cocoa mint lemon vanilla '
+         'honey spicy sweet bitter fresh dried frozen kitchen garden outdoor '
+         'cotton leather steel wooden glass classic premium family travel pack').split()
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _batches(total, batch_size):
+    for start in range(0, total, batch_size):
+        yield start, min(batch_size, total - start)
+
+
+class Seeder:
+    def __init__(self, batch_size=5000, seed=None, stdout=None):
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.run = uuid4().hex[:8]
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def timed(self, label, total, create):
+        started = time.monotonic()
+        ids = create()
+        elapsed = time.monotonic() - started
+        self.log(f'{label}: {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)')
+        return ids
+
+    def seed(self, collections=100, promotions=20, products=10000, customers=1000,
+             orders=5000, reviews=20000, tags=200, index_search=True):
+        collection_ids = self.timed('collections', collections, lambda: self.collections(collections))
+        promotion_ids = self.timed('promotions', promotions, lambda: self.promotions(promotions))
+        product_ids = self.timed('products', products,
+                                 lambda: self.products(products, collection_ids, promotion_ids))
+        customer_ids = self.timed('customers', customers, lambda: self.customers(customers))
+        self.timed('orders', orders, lambda: self.orders(orders, customer_ids, product_ids))
+        self.timed('reviews', reviews, lambda: self.reviews(reviews, product_ids))
+        self.timed('tags', tags, lambda: self.tags(tags, product_ids))
+        self.timed('denormalized data', products, lambda: self.rebuild(index_search))
+
+    def collections(self, total):
+        return [collection.pk for collection in Collection.objects.bulk_create(
+            [Collection(title=f'{_sentence(self.rng, 2).title()} {index}') for index in range(total)],
+            batch_size=self.batch_size)]
+
+    def promotions(self, total):
+        return [promotion.pk for promotion in Promotion.objects.bulk_create(
+            [Promotion(description=f'{self.rng.randint(5, 50)}% off', discount=self.rng.randint(5, 50) / 100)
+             for index in range(total)],
+            batch_size=self.batch_size)]
+
+    def products(self, total, collection_ids, promotion_ids):
+        ids = []
+        PromotionLink = Product.promotions.through
+        for start, size in _batches(total, self.batch_size):
+            prices = [Decimal(self.rng.randint(100, 99999)) / 100 for index in range(size)]
+            with transaction.atomic():
+                created = Product.objects.bulk_create([
+                    # effective_price is recomputed in rebuild() once promotions are linked
+                    Product(title=_sentence(self.rng, 3).title(),
+                            description=_sentence(self.rng, self.rng.randint(10, 60)),
+                            slug=f'seed-{self.run}-{start + index}',
+                            price=price, effective_price=price,
+                            inventory=self.rng.randint(0, 500),
+                            collection_id=self.rng.choice(collection_ids))
+                    for index, price in enumerate(prices)])
+                # roughly one product in ten is on promotion
+                if promotion_ids:
+                    PromotionLink.objects.bulk_create([
+                        PromotionLink(product_id=product.pk, promotion_id=self.rng.choice(promotion_ids))
+                        for product in created if self.rng.random() < 0.1])
+            ids += [product.pk for product in created]
+        return ids
+
+    def customers(self, total):
+        User = get_user_model()
+        ids = []
+        for start, size in _batches(total, self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    # '!' is an unusable password, hashing a real one would dominate the run
+                    User(username=f'seed-{self.run}-{start + index}', password='!',
+                         email=f'seed-{self.run}-{start + index}@example.com',
+                         first_name=self.rng.choice(WORDS).title(), last_name=self.rng.choice(WORDS).title())
+                    for index in range(size)])
+                created = Customer.objects.bulk_create([
+                    Customer(user_id=user.pk, phone=f'{self.rng.randint(10 ** 9, 10 ** 10 - 1)}',
+                             membership=self.rng.choice(Customer.MEMBERSHIP_CHOICES)[0])
+                    for user in users])
+            ids += [customer.pk for customer in created]
+        return ids
+
+    def orders(self, total, customer_ids, product_ids):
+        statuses = [choice for choice, label in Order.PAYMENT_STATUS_CHOICES]
+        for start, size in _batches(total, self.batch_size):
+            with transaction.atomic():
+                created = Order.objects.bulk_create([
+                    Order(customer_id=self.rng.choice(customer_ids), payment_status=self.rng.choice(statuses))
+                    for index in range(size)])
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order.pk, product_id=product_id,
+                              quantity=self.rng.randint(1, 5),
+                              unit_price=Decimal(self.rng.randint(100, 99999)) / 100)
+                    for order in created
+                    for product_id in self.rng.sample(product_ids, min(len(product_ids), self.rng.randint(1, 4)))])
+
+    def reviews(self, total, product_ids):
+        for start, size in _batches(total, self.batch_size):
+            Review.objects.bulk_create([
+                Review(product_id=self.rng.choice(product_ids),
+                       name=self.rng.choice(WORDS).title(),
+                       description=_sentence(self.rng, self.rng.randint(5, 40)))
+                for index in range(size)])
+
+    def tags(self, total, product_ids):
+        tag_ids = [tag.pk for tag in Tag.objects.bulk_create(
+            [Tag(label=f'{self.rng.choice(WORDS)}-{index}') for index in range(total)],
+            batch_size=self.batch_size)]
+        if not tag_ids:
+            return
+        product_type = ContentType.objects.get_for_model(Product).id
+        # up to three tags per product
+        for start, size in _batches(len(product_ids), self.batch_size):
+            TaggedItem.objects.bulk_create([
+                TaggedItem(tag_id=tag_id, content_type_id=product_type, object_id=product_id)
+                for product_id in product_ids[start:start + size]
+                for tag_id in self.rng.sample(tag_ids, min(len(tag_ids), self.rng.randint(0, 3)))])
+
+    def rebuild(self, index_search=True):
+        rebuild_product_counts()
+        rebuild_effective_prices(self.batch_size)
+        rebuild_review_stats(self.batch_size)
+        rebuild_order_summaries(self.batch_size)
+        if index_search:
+            get_search_backend().rebuild(batch_size=self.batch_size)
+        for model in (Product, Collection, Promotion, Tag, TaggedItem):
+            bump_version(model)
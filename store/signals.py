@@ -0,0 +1,221 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from tags.models import Tag, TaggedItem
+
+from .authentication import bump_user_version
+from .cache import bump_version
+from .counters import (add_review, adjust_order_count, adjust_order_spend, adjust_product_count, order_customer,
+                       refresh_order_summaries, remove_review)
+from .models import Collection, Customer, Order, OrderItem, Product, Promotion, Review
+from .pricing import discounted_price, product_best_discount, recompute_effective_prices
+from .search import get_search_backend
+
+
+# ============================= response cache invalidation ========================
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def invalidate_response_cache(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def invalidate_product_promotions(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Product)
+
+
+# ============================= cached request user ========================
+# djoser's set_password / reset_password_confirm save the user, so a password
+# change lands here as well. Like bump_version(), the version moves once the
+# change is committed
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_cached_customer(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+# ============================= Collection.product_count ========================
+@receiver(post_save, sender=Product)
+def update_product_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_product_count(instance.collection_id, 1)
+    else:
+        previous = getattr(instance, '_loaded_collection_id', None)
+        if previous is not None and previous != instance.collection_id:
+            adjust_product_count(previous, -1)
+            adjust_product_count(instance.collection_id, 1)
+    instance._loaded_collection_id = instance.collection_id
+
+
+@receiver(post_delete, sender=Product)
+def update_product_count_on_delete(sender, instance, **kwargs):
+    adjust_product_count(instance.collection_id, -1)
+
+
+# ============================= Product.review_count / latest_review_date ========================
+@receiver(post_save, sender=Review)
+def update_review_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_product_id', None)
+    if created:
+        add_review(instance.product_id, instance.date)
+    elif previous is not None and previous != instance.product_id:
+        remove_review(previous)
+        add_review(instance.product_id, instance.date)
+    else:
+        return
+    instance._loaded_product_id = instance.product_id
+    bump_version(Product)
+
+
+@receiver(post_delete, sender=Review)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+    remove_review(instance.product_id)
+    bump_version(Product)
+
+
+# ============================= Customer.order_count / lifetime_spend ========================
+# place_order adds the spend of the items it bulk creates itself
+@receiver(post_save, sender=Order)
+def update_order_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_customer_id', None)
+    if created:
+        adjust_order_count(instance.customer_id, 1)
+    elif previous is not None and previous != instance.customer_id:
+        refresh_order_summaries([previous, instance.customer_id])
+    instance._loaded_customer_id = instance.customer_id
+
+
+@receiver(post_delete, sender=Order)
+def update_order_summary_on_delete(sender, instance, **kwargs):
+    # its items are protected, an order is only deleted once they are gone
+    adjust_order_count(instance.customer_id, -1)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_spend_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_order_id', None)
+    total = instance.quantity * Decimal(instance.unit_price)
+    if created:
+        adjust_order_spend(order_customer(instance.order_id), total)
+    elif previous is not None and previous != instance.order_id:
+        refresh_order_summaries(Order.objects.filter(pk__in=[previous, instance.order_id]).values('customer_id'))
+    elif previous is not None:
+        delta = total - instance._loaded_quantity * instance._loaded_unit_price
+        if delta:
+            adjust_order_spend(order_customer(instance.order_id), delta)
+    instance._loaded_order_id = instance.order_id
+    instance._loaded_quantity = instance.quantity
+    instance._loaded_unit_price = instance.unit_price
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_order_spend_on_delete(sender, instance, **kwargs):
+    adjust_order_spend(order_customer(instance.order_id), -instance.quantity * Decimal(instance.unit_price))
+
+
+# ============================= search index ========================
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_save, sender=Collection)
+def index_collection_products(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if getattr(instance, '_loaded_title', None) != instance.title:
+        get_search_backend().index_collection(instance.pk)
+    instance._loaded_title = instance.title
+
+
+# ============================= Product.effective_price ========================
+def saves_new_price(instance, update_fields):
+    return ((update_fields is None or 'price' in update_fields) and
+            getattr(instance, '_loaded_price', None) != instance.price)
+
+
+@receiver(pre_save, sender=Product)
+def set_effective_price(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if instance._state.adding:
+        # a product being created has no promotions yet
+        instance.effective_price = instance.price
+    elif saves_new_price(instance, update_fields):
+        # written by the UPDATE of the save itself, nothing is read back
+        instance.effective_price = discounted_price(instance.price, product_best_discount(instance.pk))
+
+
+@receiver(post_save, sender=Product)
+def update_effective_price_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        instance._loaded_price = instance.price
+        return
+    if saves_new_price(instance, update_fields):
+        if update_fields is not None and 'effective_price' not in update_fields:
+            # save(update_fields=['price']) left it out of the UPDATE
+            Product.objects.filter(pk=instance.pk).update(effective_price=instance.effective_price)
+        instance._loaded_price = instance.price
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def update_effective_price_on_promotions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # product.promotions.add() / remove() / clear() / set()
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.effective_price = discounted_price(instance.price, product_best_discount(instance.pk))
+            Product.objects.filter(pk=instance.pk).update(effective_price=instance.effective_price)
+    elif action == 'pre_clear':
+        instance._cleared_product_ids = list(instance.product_set.values_list('id', flat=True))
+    elif action == 'post_clear':
+        recompute_effective_prices(getattr(instance, '_cleared_product_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        recompute_effective_prices(list(pk_set))
+
+
+@receiver(post_save, sender=Promotion)
+def update_effective_price_on_discount(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and getattr(instance, '_loaded_discount', None) != instance.discount:
+        recompute_effective_prices(
+            Product.promotions.through.objects.filter(promotion_id=instance.pk).values('product_id'))
+    instance._loaded_discount = instance.discount
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promoted_products(sender, instance, **kwargs):
+    instance._promoted_product_ids = list(
+        Product.promotions.through.objects.filter(promotion_id=instance.pk).values_list('product_id', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def update_effective_price_on_promotion_delete(sender, instance, **kwargs):
+    recompute_effective_prices(getattr(instance, '_promoted_product_ids', []))
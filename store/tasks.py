@@ -0,0 +1,20 @@
+import logging
+
+from celery import shared_task
+
+from .cart import sweep_expired_carts as sweep_carts
+from .inventory import release_expired
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def sweep_expired_carts():
+    stats = sweep_carts()
+    logger.info('Swept %(carts)s expired carts and %(items)s items in %(seconds).2fs', stats)
+    return stats
+
+
+@shared_task
+def release_expired_reservations():
+    return release_expired()
@@ -0,0 +1,136 @@
+import re
+
+from asgiref.sync import async_to_sync
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .benchmarks import NO_CACHE
+from .profiling import QUERY_BUDGETS
+
+# ============================= query budgets for tests ========================
+# ProfilingMiddleware attaches a `profile` to every response, so a test can do:
+#
+#     class ProductTests(QueryBudgetMixin, APITestCase):
+#         query_budgets = {'GET products-list': 3}
+#
+#         def test_list(self):
+#             self.assertWithinQueryBudget(self.client.get('/products/'))
+
+
+def assert_query_budget(response, budget=None, budgets=None):
+    profile = getattr(response, 'profile', None)
+    if profile is None:
+        raise AssertionError('The response has no profile, is store.profiling.ProfilingMiddleware installed?')
+    if budget is None:
+        budget = {**QUERY_BUDGETS, **(budgets or {})}.get(profile.budget_key)
+    if budget is None:
+        raise AssertionError(f'No query budget declared for {profile.budget_key!r}.')
+    if profile.queries > budget:
+        raise AssertionError(
+            f'{profile.method} {profile.route} ran {profile.queries} queries, '
+            f'the budget is {budget} ({profile.db_time * 1000:.1f}ms in the database).')
+    return profile
+
+
+class QueryBudgetMixin:
+    query_budgets = {}
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        try:
+            return assert_query_budget(response, budget, self.query_budgets)
+        except AssertionError as error:
+            self.fail(str(error))
+
+
+# ============================= fast list parity ========================
+# store.api.fastpath must render exactly what the serializers render, compare
+# the two paths on any list URL:
+#
+#     assert_fast_list_parity(self.client, '/products/?ordering=price')
+
+
+def assert_fast_list_parity(client, url, **extra):
+    from .api.fastpath import FastListMixin
+
+    enabled = FastListMixin.fast_list
+    try:
+        with override_settings(CACHES=NO_CACHE):
+            FastListMixin.fast_list = True
+            fast = client.get(url, **extra)
+            FastListMixin.fast_list = False
+            regular = client.get(url, **extra)
+    finally:
+        FastListMixin.fast_list = enabled
+    # the same error from both paths says nothing about the rows they render
+    if fast.status_code != 200 or regular.status_code != 200:
+        raise AssertionError(f'GET {url}: fast path answered {fast.status_code}, serializers {regular.status_code}, '
+                             f'expected 200 from both.')
+    if fast.content != regular.content:
+        raise AssertionError(f'GET {url}: fast path output differs from the serializers:\n'
+                             f'  fast:        {fast.content[:300]!r}\n  serializers: {regular.content[:300]!r}')
+    return fast
+
+
+# ============================= async view parity ========================
+# store.asyncviews must answer exactly what the ViewSets answer, compare the
+# ASGI handler (async views) with the WSGI handler on any URL:
+#
+#     assert_async_parity(Client(), AsyncClient(), '/products/?ordering=price')
+VOLATILE_HEADERS = {'date', 'server-timing'}
+
+
+def _headers(response):
+    return {name.lower(): value for name, value in response.items() if name.lower() not in VOLATILE_HEADERS}
+
+
+def assert_async_parity(client, async_client, url, **extra):
+    with override_settings(CACHES=NO_CACHE):
+        regular = client.get(url, **extra)
+        asynchronous = async_to_sync(async_client.get)(url, **extra)
+    if asynchronous.status_code != regular.status_code:
+        raise AssertionError(f'GET {url}: ASGI answered {asynchronous.status_code}, WSGI {regular.status_code}.')
+    if asynchronous.content != regular.content:
+        raise AssertionError(f'GET {url}: ASGI output differs from WSGI:\n'
+                             f'  asgi: {asynchronous.content[:300]!r}\n  wsgi: {regular.content[:300]!r}')
+    if _headers(asynchronous) != _headers(regular):
+        raise AssertionError(f'GET {url}: ASGI headers differ from WSGI:\n'
+                             f'  asgi: {_headers(asynchronous)}\n  wsgi: {_headers(regular)}')
+    return asynchronous
+
+
+# ============================= query plans (PostgreSQL) ========================
+# every SELECT an endpoint runs must be able to use an index on the store (and
+# tags) tables. Sequential scans are disabled while explaining, so a plan that
+# still has a `Seq Scan on store_...` node has no usable index, however small
+# the test tables are.
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(sql, using='default'):
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN {sql}')
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def seq_scans(plan, prefix=('store_', 'tags_')):
+    return [table for table in SEQ_SCAN.findall(plan) if table.startswith(prefix)]
+
+
+def assert_index_scans(run, using='default'):
+    """Call `run()` and check the plan of every SELECT it executed."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise AssertionError('Query plans are only checked on PostgreSQL.')
+    with override_settings(CACHES=NO_CACHE), CaptureQueriesContext(connection) as queries:
+        result = run()
+    problems = []
+    for query in queries.captured_queries:
+        if not query['sql'].lstrip().upper().startswith('SELECT'):
+            continue
+        plan = explain(query['sql'], using)
+        if seq_scans(plan):
+            problems.append(f'{query["sql"]}\n{plan}')
+    if problems:
+        raise AssertionError('Sequential scan(s) on store or tags tables:\n\n' + '\n\n'.join(problems))
+    return result
@@ -1,3 +1,818 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Sum
+from django.test import AsyncClient, SimpleTestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from tags.models import Tag, TaggedItem
+
+from .asyncviews import ProductDetailView
+from .authentication import get_cached_user
+from .cache import get_cache
+from .cart import sweep_expired_carts
+from .catalog import import_catalog
+from .counters import stale_order_summaries, stale_product_counts, stale_review_stats
+from .db import pool as db_pool
+from .db.pool import ConnectionPool, PoolTimeout
+from .exports import accepts_gzip
+from .inventory import InsufficientStock, reserve_cart
+from .models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, Promotion, Reservation, Review
+from .orders import place_order
+from .pricing import stale_effective_prices
+from .testing import QueryBudgetMixin, assert_fast_list_parity, assert_index_scans, explain
+from .views import ProductViewSet
+
+
+def make_cursor(**payload):
+    cursor = {'id': 1, 'r': False, **payload}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('ascii')).decode('ascii')
+
+
+class StoreTestData:
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = Collection.objects.create(title='Coffee')
+        cls.products = [
+            Product.objects.create(title=f'Organic coffee {index}', description='whole roast beans',
+                                   slug=f'coffee-{index}', price=10 + index, inventory=100,
+                                   collection=cls.collection)
+            for index in range(5)]
+
+    def setUp(self):
+        # versions are only bumped on commit, which TestCase never does
+        get_cache().clear()
+
+
+class KeysetCursorTests(StoreTestData, APITestCase):
+    def get_products(self, **cursor):
+        return self.client.get(reverse('products-list'), {'cursor': make_cursor(**cursor)})
+
+    def test_pages_follow_the_cursor(self):
+        first = self.client.get(reverse('products-list'), {'ordering': 'price', 'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in first['results'] + second['results']],
+                         [product.pk for product in self.products[:4]])
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('products-list'), {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_cursor_value_of_the_wrong_type_is_not_found(self):
+        self.assertEqual(self.get_products(o='-last_update', v=[1]).status_code, 404)
+        self.assertEqual(self.get_products(o='-last_update', v={'a': 1}).status_code, 404)
+
+    def test_null_cursor_value_is_not_found(self):
+        self.assertEqual(self.get_products(o='-last_update', v=None).status_code, 404)
+
+    def test_unparsable_cursor_value_is_not_found(self):
+        self.assertEqual(self.get_products(o='-last_update', v=1).status_code, 404)
+        self.assertEqual(self.get_products(o='-last_update', v='yesterday').status_code, 404)
+
+    def test_search_rank_cursor_must_be_a_number(self):
+        url = reverse('products-list')
+        first = self.client.get(url, {'search': 'coffee', 'page_size': 2}).json()
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual(self.client.get(first['next']).status_code, 200)
+        cursor = make_cursor(o='-search_rank', v='abc')
+        self.assertEqual(self.client.get(url, {'search': 'coffee', 'cursor': cursor}).status_code, 404)
+
+
+class TaggedProductTests(QueryBudgetMixin, StoreTestData, APITestCase):
+    def test_first_product_detail_of_a_process_is_within_budget(self):
+        # nothing cached yet, as for the first request of a worker
+        ContentType.objects.clear_cache()
+        response = self.client.get(reverse('products-detail', args=[self.products[0].pk]))
+        self.assertEqual(response.json()['tags'], [])
+        self.assertWithinQueryBudget(response)
+
+
+class RouteQueryBudgetTests(QueryBudgetMixin, StoreTestData, APITestCase):
+    # the budgets of STORE_QUERY_BUDGETS, for every route that declares one
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        cls.user = User.objects.create_user('jane', 'jane@example.com', 'x')
+        cls.customer = Customer.objects.create(user=cls.user, phone='555-0100')
+        cls.cart = Cart.objects.create()
+        cls.orders = [Order.objects.create(customer=cls.customer) for index in range(3)]
+        for product in cls.products:
+            Review.objects.create(product=cls.products[0], name='Jane', description='Good')
+            CartItem.objects.create(cart=cls.cart, product=product, quantity=1)
+            for order in cls.orders:
+                OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.price)
+
+    def login(self, user):
+        # through CachedJWTAuthentication, as the clients do
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+    def assertRouteWithinBudget(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_product_routes(self):
+        product = self.products[0]
+        self.assertRouteWithinBudget(reverse('products-list'))
+        self.assertRouteWithinBudget(reverse('products-detail', args=[product.pk]))
+        self.assertRouteWithinBudget(reverse('product-reviews-list', args=[product.pk]))
+
+    def test_collection_routes(self):
+        self.assertRouteWithinBudget(reverse('collection-list'))
+        self.assertRouteWithinBudget(reverse('collection-detail', args=[self.collection.pk]))
+
+    def test_cart_routes(self):
+        self.assertRouteWithinBudget(reverse('cart-detail', args=[self.cart.pk]))
+        self.assertRouteWithinBudget(reverse('cart-items-list', args=[self.cart.pk]))
+
+    def test_customer_routes(self):
+        self.login(self.admin)
+        self.assertRouteWithinBudget(reverse('customer-list'))
+        self.login(self.user)
+        self.assertRouteWithinBudget(reverse('customer-me'))
+
+    def test_order_routes(self):
+        self.login(self.user)
+        self.assertRouteWithinBudget(reverse('orders-list'))
+        self.assertRouteWithinBudget(reverse('orders-detail', args=[self.orders[0].pk]))
+
+    def test_writes_have_no_budget(self):
+        self.login(self.admin)
+        with self.assertNoLogs('store.profiling', 'WARNING'):
+            response = self.client.patch(reverse('products-detail', args=[self.products[0].pk]),
+                                         {'title': 'Fresh coffee'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.profile.budget)
+
+    def test_serialization_is_timed(self):
+        response = self.client.get(reverse('products-detail', args=[self.products[0].pk]))
+        self.assertGreater(response.profile.serializer_time, 0)
+
+
+class FastListParityTests(StoreTestData, APITestCase):
+    # every list route of a FastListMixin ViewSet, rendered by both paths
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        product = cls.products[0]
+        product.promotions.add(Promotion.objects.create(description='15% off', discount=0.15))
+        TaggedItem.objects.create(tag=Tag.objects.create(label='organic'), content_object=product)
+        for index in range(3):
+            Review.objects.create(product=product, name=f'Reviewer {index}', description='Good')
+        cls.cart = Cart.objects.create()
+        CartItem.objects.bulk_create([CartItem(cart=cls.cart, product=product, quantity=index + 1)
+                                      for index, product in enumerate(cls.products)])
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x')
+        Customer.objects.create(user=cls.admin, phone='555-0100')
+
+    def assertParity(self, *urls):
+        for url in urls:
+            with self.subTest(url=url):
+                try:
+                    assert_fast_list_parity(self.client, url)
+                except AssertionError as error:
+                    self.fail(str(error))
+
+    def test_products(self):
+        products = reverse('products-list')
+        self.assertParity(
+            products,
+            f'{products}?ordering=price&page_size=2',
+            f'{products}?ordering=-effective_price&price__gt=10',
+            f'{products}?collection_id={self.collection.pk}',
+            f'{products}?search=coffee',
+            f'{products}?tag=organic',
+            f'{products}?fields=id,title,price,promotions,tags',
+            f'{products}?exclude=description,promotions')
+
+    def test_collections(self):
+        self.assertParity(reverse('collection-list'), f"{reverse('collection-list')}?fields=id,product_count")
+
+    def test_reviews(self):
+        self.assertParity(reverse('product-reviews-list', args=[self.products[0].pk]))
+
+    def test_cart_items(self):
+        self.assertParity(reverse('cart-items-list', args=[self.cart.pk]))
+
+    def test_customers(self):
+        self.client.force_authenticate(self.admin)
+        self.assertParity(reverse('customer-list'), f"{reverse('customer-list')}?exclude=phone")
+
+    def test_the_same_error_from_both_paths_is_not_parity(self):
+        with self.assertRaises(AssertionError):
+            assert_fast_list_parity(self.client, f"{reverse('products-list')}?cursor=abc")
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are checked on PostgreSQL')
+class QueryPlanTests(StoreTestData, APITestCase):
+    def assertUsesIndex(self, index, url):
+        with CaptureQueriesContext(connection) as queries:
+            assert_index_scans(lambda: self.client.get(url))
+        plans = [explain(query['sql']) for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(any(index in plan for plan in plans), f'GET {url} does not use {index}:\n' + '\n\n'.join(plans))
+
+    def test_product_pages_use_the_keyset_indexes(self):
+        products = reverse('products-list')
+        collection_id = self.collection.pk
+        self.assertUsesIndex('store_product_updated_idx', products)
+        self.assertUsesIndex('store_product_price_idx', f'{products}?ordering=price')
+        self.assertUsesIndex('store_product_eff_price_idx', f'{products}?ordering=-effective_price')
+        self.assertUsesIndex('store_product_coll_updated_idx', f'{products}?collection_id={collection_id}')
+        self.assertUsesIndex('store_product_coll_price_idx', f'{products}?collection_id={collection_id}&ordering=price')
+
+    def test_reviews_and_orders_use_their_indexes(self):
+        product = self.products[0]
+        Review.objects.create(product=product, name='Jane', description='Good')
+        self.assertUsesIndex('store_review_product_date_idx', reverse('product-reviews-list', args=[product.pk]))
+        user = get_user_model().objects.create_user('jane', 'jane@example.com', 'x')
+        Order.objects.create(customer=Customer.objects.create(user=user, phone='555-0100'))
+        self.client.force_authenticate(user)
+        self.assertUsesIndex('store_order_customer_idx', reverse('orders-list'))
+
+
+class ProductCountTests(StoreTestData, APITestCase):
+    def test_product_count_follows_creates_moves_and_deletes(self):
+        tea = Collection.objects.create(title='Tea')
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.collection = tea
+        product.save()
+        Product.objects.create(title='Green tea', description='leaves', slug='green-tea', price=4, inventory=10,
+                               collection=tea)
+        Product.objects.get(pk=self.products[1].pk).delete()
+
+        self.assertEqual(self.client.get(reverse('collection-detail', args=[self.collection.pk])).json(),
+                         {'id': self.collection.pk, 'title': 'Coffee', 'product_count': 3})
+        self.assertEqual(self.client.get(reverse('collection-detail', args=[tea.pk])).json()['product_count'], 2)
+        self.assertFalse(stale_product_counts().exists())
+
+
+class SparseFieldsetTests(StoreTestData, APITestCase):
+    def test_fields_selects_the_fields_and_their_columns(self):
+        url = reverse('products-detail', args=[self.products[0].pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,title'})
+        self.assertEqual(response.json(), {'id': self.products[0].pk, 'title': 'Organic coffee 0'})
+        self.assertFalse([query['sql'] for query in queries if '"store_product"."description"' in query['sql']])
+
+    def test_exclude_drops_the_fields_of_every_row(self):
+        response = self.client.get(reverse('products-list'), {'exclude': 'description,promotions', 'page_size': 10})
+        rows = response.json()['results']
+        self.assertEqual(len(rows), 5)
+        for row in rows:
+            self.assertIn('title', row)
+            self.assertNotIn('description', row)
+            self.assertNotIn('promotions', row)
+
+    def test_unknown_fields_are_ignored(self):
+        response = self.client.get(reverse('collection-list'), {'fields': 'id,nope'})
+        self.assertEqual(response.json(), [{'id': self.collection.pk}])
+
+
+class ExportTests(StoreTestData, APITestCase):
+    def export(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return response, content.decode()
+
+    def test_ndjson_export_streams_every_filtered_row(self):
+        response, content = self.export(f"{reverse('products-export')}?format=ndjson&price__gt=11")
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(sorted(row['id'] for row in rows), [product.pk for product in self.products[2:]])
+
+    def test_csv_export_is_gzipped_on_request(self):
+        response, content = self.export(f"{reverse('products-export')}?format=csv", HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['slug'], 'coffee-0')
+
+    def test_gzip_only_when_the_client_accepts_it(self):
+        def accepts(header):
+            return accepts_gzip(mock.Mock(META={'HTTP_ACCEPT_ENCODING': header}))
+
+        for header in ('gzip', 'deflate, GZIP', 'br;q=1.0, gzip;q=0.5', '*', 'br, *;q=0.1'):
+            self.assertTrue(accepts(header), header)
+        for header in ('', 'identity', 'gzip;q=0', 'x-gzip', 'br, gzip; q=0.0', '*;q=0', 'gzip;q=0, *'):
+            self.assertFalse(accepts(header), header)
+
+    def test_order_export_is_limited_to_the_customer(self):
+        user = get_user_model().objects.create_user('jane', 'jane@example.com', 'x')
+        order = Order.objects.create(customer=Customer.objects.create(user=user, phone='555-0100'))
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=2, unit_price=10)
+        other = get_user_model().objects.create_user('john', 'john@example.com', 'x')
+        Order.objects.create(customer=Customer.objects.create(user=other, phone='555-0101'))
+        self.client.force_authenticate(user)
+        response, content = self.export(f"{reverse('orders-export')}?format=ndjson")
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [order.pk])
+
+
+class ReviewStatsTests(StoreTestData, APITestCase):
+    def test_review_count_and_latest_date_follow_the_reviews(self):
+        product, other = self.products[:2]
+        url = reverse('product-reviews-list', args=[product.pk])
+        ids = [self.client.post(url, {'name': f'Reviewer {index}', 'description': 'Good'}).json()['id']
+               for index in range(3)]
+        Review.objects.create(product=other, name='Elsewhere', description='Fine')
+        for days, pk in zip([3, 1], ids):
+            Review.objects.filter(pk=pk).update(date=timezone.localdate() - timedelta(days=days))
+        # the latest date is read back from the remaining reviews
+        self.client.delete(reverse('product-reviews-detail', args=[product.pk, ids[2]]))
+
+        product.refresh_from_db()
+        self.assertEqual((product.review_count, product.latest_review_date),
+                         (2, timezone.localdate() - timedelta(days=1)))
+        self.assertFalse(stale_review_stats().exists())
+
+    def test_reviews_are_listed_per_product_newest_first(self):
+        product, other = self.products[:2]
+        for index in range(3):
+            Review.objects.create(product=product, name=f'Reviewer {index}', description='Good')
+        Review.objects.create(product=other, name='Elsewhere', description='Fine')
+        oldest = Review.objects.filter(product=product).order_by('id').first()
+        Review.objects.filter(pk=oldest.pk).update(date=timezone.localdate() - timedelta(days=3))
+
+        first = self.client.get(reverse('product-reviews-list', args=[product.pk]), {'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        names = [review['name'] for review in first['results'] + second['results']]
+        self.assertEqual(names, ['Reviewer 2', 'Reviewer 1', 'Reviewer 0'])
+        self.assertIsNone(second['next'])
+
+
+class EffectivePriceTests(StoreTestData, APITestCase):
+    def test_price_and_promotion_changes_update_the_effective_price(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.promotions.add(Promotion.objects.create(description='15% off', discount=0.15))
+        self.assertEqual(str(product.effective_price), '8.50')
+
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x'))
+        response = self.client.patch(reverse('products-detail', args=[product.pk]), {'price': '19.99'})
+        self.assertEqual(response.json()['effective_price'], 16.99)
+        self.assertFalse(stale_effective_prices().exists())
+
+    def test_price_change_does_not_read_the_product_back(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.price = 12
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertEqual(product.effective_price, 12)
+        self.assertFalse([query['sql'] for query in queries
+                          if query['sql'].startswith('SELECT') and '"store_product"."effective_price"' in query['sql']])
+        self.assertEqual(Product.objects.get(pk=product.pk).effective_price, 12)
+
+
+class ResponseCacheTests(StoreTestData, APITestCase):
+    def test_write_invalidates_cached_responses_once_committed(self):
+        url = reverse('products-detail', args=[self.products[0].pk])
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(url, {'title': 'Fresh coffee'})
+            # until the commit, requests may still read the old row
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['title'], 'Fresh coffee')
+
+
+class AsyncViewsTests(StoreTestData, APITestCase):
+    async def get_product(self):
+        response = await AsyncClient().get(reverse('products-detail', args=[self.products[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.resolver_match.func.cls
+
+    async def test_async_views_are_off_by_default(self):
+        self.assertIs(await self.get_product(), ProductViewSet)
+
+    @override_settings(STORE_ASYNC_VIEWS=True)
+    async def test_async_views_serve_asgi_requests_once_enabled(self):
+        self.assertIs(await self.get_product(), ProductDetailView)
+
+
+class CartTotalTests(StoreTestData, APITestCase):
+    def test_totals_are_computed_by_the_database(self):
+        cart = Cart.objects.create()
+        for quantity, product in enumerate(self.products[:3], 1):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('cart-detail', args=[cart.pk])).json()
+        # 1 * 10 + 2 * 11 + 3 * 12
+        self.assertEqual(data['total_price'], 68)
+        self.assertEqual(sorted(item['total_price'] for item in data['items']), [10, 22, 36])
+        self.assertTrue(any('SUM(' in query['sql'].upper() for query in queries))
+
+    def test_empty_cart_total_is_zero(self):
+        cart = Cart.objects.create()
+        self.assertEqual(self.client.get(reverse('cart-detail', args=[cart.pk])).json()['total_price'], 0)
+
+
+class CartSweepTests(StoreTestData, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.expired = [Cart.objects.create() for index in range(5)]
+        self.fresh = Cart.objects.create()
+        Cart.objects.filter(pk__in=[cart.pk for cart in self.expired]).update(
+            created_at=timezone.now() - timedelta(days=8))
+        for cart in [*self.expired, self.fresh]:
+            CartItem.objects.create(cart=cart, product=self.products[0], quantity=1)
+        reserve_cart(self.expired[0].pk)
+
+    def test_expired_carts_are_deleted_in_batches(self):
+        stats = sweep_expired_carts(max_age=timedelta(days=7), batch_size=2)
+        self.assertEqual((stats['carts'], stats['items'], stats['batches']), (5, 5, 3))
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [self.fresh.pk])
+        # the stock held by an expired cart goes back to inventory
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 100)
+
+    def test_dry_run_deletes_nothing(self):
+        stats = sweep_expired_carts(max_age=timedelta(days=7), batch_size=2, dry_run=True)
+        self.assertEqual((stats['carts'], stats['items'], stats['batches']), (5, 5, 3))
+        self.assertEqual(Cart.objects.count(), 6)
+
+
+class BulkCartItemTests(StoreTestData, APITestCase):
+    def test_bulk_add_merges_repeated_and_existing_products(self):
+        first, second = self.products[:2]
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=first, quantity=1)
+        response = self.client.post(reverse('cart-items-bulk', args=[cart.pk]), [
+            {'product_id': first.pk, 'quantity': 2},
+            {'product_id': second.pk, 'quantity': 1},
+            {'product_id': first.pk, 'quantity': 3},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({item['product']['title']: item['quantity'] for item in response.json()['items']},
+                         {first.title: 6, second.title: 1})
+        self.assertEqual(dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')),
+                         {first.pk: 6, second.pk: 1})
+
+    def test_unknown_product_adds_nothing(self):
+        cart = Cart.objects.create()
+        response = self.client.post(reverse('cart-items-bulk', args=[cart.pk]), [
+            {'product_id': self.products[0].pk, 'quantity': 1},
+            {'product_id': 0, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+
+class OrderPlacementTests(StoreTestData, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user('jane', 'jane@example.com', 'x')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create()
+
+    def test_cart_becomes_an_order(self):
+        first, second = self.products[:2]
+        CartItem.objects.create(cart=self.cart, product=first, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=second, quantity=1)
+        response = self.client.post(reverse('orders-list'), {'cart_id': self.cart.pk})
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.customer.user, self.user)
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity', 'unit_price')),
+                         [(first.pk, 2, first.price), (second.pk, 1, second.price)])
+        self.assertEqual(dict(Product.objects.filter(pk__in=[first.pk, second.pk]).values_list('id', 'inventory')),
+                         {first.pk: 98, second.pk: 99})
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+        self.assertEqual((order.customer.order_count, order.customer.lifetime_spend), (1, 31))
+        self.assertFalse(stale_order_summaries().exists())
+
+    def test_cart_beyond_the_stock_is_not_ordered(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=101)
+        response = self.client.post(reverse('orders-list'), {'cart_id': self.cart.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).inventory, 100)
+        self.assertTrue(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_empty_cart_is_not_ordered(self):
+        response = self.client.post(reverse('orders-list'), {'cart_id': self.cart.pk})
+        self.assertEqual(response.json(), {'cart_id': ['The cart is empty.']})
+        self.assertFalse(Order.objects.exists())
+
+
+class CatalogImportTests(StoreTestData, APITestCase):
+    def import_rows(self, *rows, **options):
+        feed = '\n'.join(['slug,title,description,price,inventory,collection', *rows])
+        return import_catalog(io.BytesIO(feed.encode()), 'csv', **options)
+
+    def test_bad_rows_are_rejected_and_the_rest_is_imported(self):
+        long_text = 'x' * 256
+        result = self.import_rows(
+            'tea-1,Green tea,leaves,4.50,10,Coffee',
+            'tea-2,Green tea,leaves,NaN,10,Coffee',
+            'tea-3,Green tea,leaves,4.50,Infinity,Coffee',
+            'tea-4,Green tea,leaves,4.50,99999999999999999999,Coffee',
+            f'tea-5,{long_text},leaves,4.50,10,Coffee',
+            f'{long_text},Green tea,leaves,4.50,10,Coffee',
+            f'tea-6,Green tea,leaves,4.50,10,{long_text}',
+            create_collections=True)
+        self.assertEqual([line for line, error in result.errors], [3, 4, 5, 6, 7, 8])
+        self.assertEqual((result.rows, result.created), (7, 1))
+        self.assertEqual(list(Product.objects.filter(slug__startswith='tea-').values_list('slug', flat=True)),
+                         ['tea-1'])
+
+    def test_dry_run_reports_bad_rows_without_writing(self):
+        result = self.import_rows('tea-1,Green tea,leaves,4.50,10,Coffee', 'tea-2,Green tea,leaves,NaN,10,Coffee',
+                                  dry_run=True)
+        self.assertEqual(result.errors, [(3, "invalid price 'NaN'")])
+        self.assertFalse(Product.objects.filter(slug='tea-1').exists())
+
+
+class CartTests(StoreTestData, APITestCase):
+    def test_malformed_cart_id_is_not_found(self):
+        self.assertEqual(self.client.delete('/carts/not-a-uuid/').status_code, 404)
+        self.assertEqual(self.client.post('/carts/not-a-uuid/reserve/').status_code, 404)
+        self.assertEqual(self.client.post('/carts/not-a-uuid/items/bulk/', [], format='json').status_code, 404)
+
+    def test_deleting_a_reserved_cart_releases_its_stock(self):
+        product = self.products[0]
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=product, quantity=3)
+        self.assertEqual(self.client.post(reverse('cart-reserve', args=[cart.pk])).status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 97)
+
+        self.assertEqual(self.client.delete(reverse('cart-detail', args=[cart.pk])).status_code, 204)
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 100)
+        self.assertFalse(Reservation.objects.filter(cart_id=cart.pk).exists())
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+
+
+class CachedUserTests(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user('jane', 'jane@example.com', 'x')
+        self.customer = Customer.objects.create(user=self.user, phone='555-0100')
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+
+    def get_me(self):
+        response = self.client.get(reverse('customer-me'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_user_and_customer_come_from_the_cache(self):
+        self.get_me()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_me()['phone'], '555-0100')
+        self.assertEqual(len(queries), 0)
+
+    def test_customer_change_invalidates_the_cached_user(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.phone = '555-0199'
+            self.customer.save()
+        self.assertEqual(self.get_me()['phone'], '555-0199')
+
+    def test_user_change_invalidates_the_cached_user(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Janet'
+            self.user.save()
+        self.assertEqual(get_cached_user(self.user.pk).first_name, 'Janet')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('customer-me')).status_code, 401)
+
+
+class CustomerHistoryTests(APITestCase):
+    def test_malformed_customer_id_is_not_found(self):
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'x'))
+        self.assertEqual(self.client.get('/customer/abc/history/').status_code, 404)
+
+
+class FakeConnection:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+        self.broken = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    def wait_for_waiters(self, pool, count):
+        deadline = time.monotonic() + 5
+        while pool.gauges()['pool_waiting'] < count:
+            self.assertLess(time.monotonic(), deadline, 'the waiters never queued')
+            time.sleep(0.001)
+
+    def test_connections_are_reused_last_in_first_out(self):
+        pool = ConnectionPool('test', max_size=3)
+        first, second = pool.getconn(self.connect), pool.getconn(self.connect)
+        pool.putconn(first)
+        pool.putconn(second)
+        self.assertIs(pool.getconn(self.connect), second)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_checkout_times_out_at_max_size(self):
+        pool = ConnectionPool('test', max_size=2, timeout=0.05)
+        pool.getconn(self.connect)
+        pool.getconn(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.gauges(), {'pool_size': 2, 'pool_idle': 0, 'pool_waiting': 0, 'pool_max_size': 2})
+
+    def test_returned_connections_go_to_the_oldest_waiter(self):
+        pool = ConnectionPool('test', max_size=1)
+        connection = pool.getconn(self.connect)
+        received = []
+
+        def wait(name):
+            received.append((name, pool.getconn(self.connect)))
+            pool.putconn(received[-1][1])
+
+        waiters = []
+        for name in ('first', 'second', 'third'):
+            waiters.append(threading.Thread(target=wait, args=[name]))
+            waiters[-1].start()
+            self.wait_for_waiters(pool, len(waiters))
+        pool.putconn(connection)
+        for waiter in waiters:
+            waiter.join()
+        self.assertEqual(received, [('first', connection), ('second', connection), ('third', connection)])
+        self.assertEqual(len(self.opened), 1)
+
+    def test_connection_handed_over_while_timing_out_is_kept(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.05)
+        connection = pool.getconn(self.connect)
+
+        def hand_over_then_time_out(event, timeout):
+            # putconn() gets the lock between the wait and the timeout handling
+            pool.putconn(connection)
+            return False
+
+        with mock.patch.object(threading.Event, 'wait', hand_over_then_time_out):
+            self.assertIs(pool.getconn(self.connect), connection)
+        self.assertEqual(pool.gauges()['pool_waiting'], 0)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.05)
+
+        def fail():
+            raise OSError('connection refused')
+
+        with self.assertRaises(OSError):
+            pool.getconn(fail)
+        self.assertEqual(pool.gauges()['pool_size'], 0)
+        self.assertEqual(pool.getconn(self.connect).name, 0)
+
+    def test_failed_check_discards_the_connection(self):
+        pool = ConnectionPool('test', max_size=1, check=lambda connection: not connection.broken)
+        connection = pool.getconn(self.connect)
+        connection.broken = True
+        pool.putconn(connection)
+        fresh = pool.getconn(self.connect)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(fresh, connection)
+        self.assertEqual(pool.gauges()['pool_size'], 1)
+
+    def test_idle_connections_beyond_min_size_expire(self):
+        pool = ConnectionPool('test', min_size=2, max_size=3, max_idle=60)
+        connections = [pool.getconn(self.connect) for index in range(3)]
+        with mock.patch('store.db.pool.time.monotonic', return_value=time.monotonic() - 120):
+            pool.putconn(connections[0])
+            pool.putconn(connections[1])
+        pool.putconn(connections[2])
+        # only the oldest goes, min_size connections are kept however old
+        self.assertEqual([connection.closed for connection in connections], [True, False, False])
+        self.assertEqual(pool.gauges()['pool_size'], 2)
+
+    def test_pool_inherited_through_fork_is_replaced_not_closed(self):
+        parent = db_pool.get_pool('fork-test', {'max_size': 1})
+        self.addCleanup(db_pool._pools.pop, 'fork-test', None)
+        connection = parent.getconn(self.connect)
+        parent.putconn(connection)
+        with mock.patch('store.db.pool.os.getpid', return_value=parent.pid + 1):
+            child = db_pool.get_pool('fork-test', {'max_size': 1})
+            db_pool.close_pool('fork-test')
+        self.assertIsNot(child, parent)
+        self.assertIn(parent, db_pool._inherited)
+        db_pool._inherited.remove(parent)
+        self.assertFalse(connection.closed)
+
+
+# the in-memory SQLite test database locks whole tables between connections
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentCartItemTests(TransactionTestCase):
+    threads = 8
+
+    def test_parallel_adds_of_one_product_end_up_in_one_item(self):
+        self.add_in_parallel()
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_adds_without_upsert_end_up_in_one_item(self):
+        # the row lock path used on databases without INSERT ... ON CONFLICT
+        with mock.patch('store.cart.supports_upsert', return_value=False):
+            self.add_in_parallel()
+
+    def add_in_parallel(self):
+        collection = Collection.objects.create(title='Coffee')
+        product = Product.objects.create(title='Coffee', description='beans', slug='coffee', price=10,
+                                         inventory=100, collection=collection)
+        cart = Cart.objects.create()
+        url = reverse('cart-items-list', args=[cart.pk])
+        barrier = threading.Barrier(self.threads)
+        statuses = []
+
+        def add(quantity):
+            try:
+                barrier.wait()
+                response = APIClient().post(url, {'product_id': product.pk, 'quantity': quantity})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=add, args=[index + 1]) for index in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(statuses, [201] * self.threads)
+        item = CartItem.objects.get(cart=cart)
+        self.assertEqual(item.product_id, product.pk)
+        self.assertEqual(item.quantity, sum(range(1, self.threads + 1)))
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    stock = 5
+    checkouts = 12
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        collection = Collection.objects.create(title='Coffee')
+        product = Product.objects.create(title='Coffee', description='beans', slug='coffee', price=10,
+                                         inventory=self.stock, collection=collection)
+        User = get_user_model()
+        customers = [Customer.objects.create(user=User.objects.create_user(f'user{index}', f'user{index}@example.com'))
+                     for index in range(self.checkouts)]
+        carts = [Cart.objects.create() for index in range(self.checkouts)]
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for cart in carts])
+        barrier = threading.Barrier(self.checkouts)
+        outcomes = []
+
+        def checkout(index):
+            try:
+                barrier.wait()
+                # every other cart holds its stock first
+                if index % 2:
+                    reserve_cart(carts[index].pk)
+                place_order(carts[index].pk, customers[index])
+                outcomes.append('ordered')
+            except InsufficientStock:
+                outcomes.append('sold out')
+            except Exception as error:
+                outcomes.append(repr(error))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=[index]) for index in range(self.checkouts)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(outcomes), ['ordered'] * self.stock + ['sold out'] * (self.checkouts - self.stock))
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).aggregate(sold=Sum('quantity'))['sold'], self.stock)
+        self.assertFalse(Reservation.objects.exists())
@@ -7,9 +7,9 @@ from rest_framework_nested import routers  # type: ignore
 router = routers.DefaultRouter()
 router.register('products', views.ProductViewSet, basename='products')
 router.register('collection', views.CollectionViewSet)
-router.register('review', views.ReviewViewSet)
 router.register('carts', views.CartViewSet)
 router.register('customer', views.CustomerViewSet)
+router.register('orders', views.OrderViewSet, basename='orders')
 product_router = routers.NestedDefaultRouter(router, 'products', lookup='product')
 product_router.register('reviews', views.ReviewViewSet, basename='product-reviews')
 
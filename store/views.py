@@ -1,48 +1,82 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, Prefetch
 # searching, filtering, ordering
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework import status
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, UpdateModelMixin
+from rest_framework.filters import OrderingFilter
+from rest_framework import generics, status
+from rest_framework.mixins import CreateModelMixin, ListModelMixin, RetrieveModelMixin, DestroyModelMixin, UpdateModelMixin
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser, DjangoModelPermissions
 
 # serializer
 from .filters import ProductFilter
+from .search import ProductSearchFilter
 from .api.serializers import (ProductSerializer,
                               CollectionSerializers,
                               ReviewSerializers,
                               CartSerializers,
                               CartItemSerializers,
                               AddCartItemSerializer,
-                              UpdateCartItemSerializer
+                              BulkAddCartItemSerializer,
+                              UpdateCartItemSerializer,
+                              OrderSerializer,
+                              OrderHistorySerializer,
+                              CreateOrderSerializer
                               )
 from store.api.customerSerializer import CustomerSerializer
-from .models import OrderItem, Product, Collection, Review, Cart, CartItem, Customer
+from store.api.fastpath import FastListMixin
+from store.api.sparse import SparseQuerysetMixin
+from .models import Order, OrderItem, Product, Collection, Promotion, Review, Cart, CartItem, Customer
+from likes.views import LikeMixin
+from tags.models import Tag, TaggedItem
 # pagination
 from rest_framework.pagination import PageNumberPagination
-from .pagination import DefaultPagination
+from .pagination import (DefaultPagination, OrderHistoryKeysetPagination, ProductKeysetPagination,
+                         ReviewKeysetPagination)
+from .authentication import get_customer
+from .cache import CachedResponseMixin
+from .exports import ExportMixin
+from .cart import cart_items_queryset, carts_queryset
+from .counters import order_total
+from .inventory import InsufficientStock, release_carts, reserve_cart
 from .permissions import FullDjangoModelPermission, IsAdminOrReadyOnly, ViewCustomerHistoryPermissions
+from .profiling import SerializerTimingMixin
 
 
 # ============================= ViewSets ========================
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(SerializerTimingMixin, CachedResponseMixin, FastListMixin, SparseQuerysetMixin, ExportMixin,
+                     LikeMixin, ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    # ?fields= / ?exclude= skip this prefetch when promotions are not returned,
+    # ordered so the list fast path returns promotion ids in the same order
+    prefetch_fields = [Prefetch('promotions', queryset=Promotion.objects.order_by('id'))]
+    cache_models = [Product, Collection, Promotion, Tag, TaggedItem]
     # ============================= Filter with   DjangoFilterBackend  ========================
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # ProductSearchFilter ranks ?search= over title, description and collection title
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     # filterset_fields = ['collection_id']
     # use custome filter class
     filterset_class = ProductFilter
-    pagination_class = DefaultPagination
-    search_fields = ['title', 'description', 'collection__title']
-    ordering_fields = ['price', 'last_update']
+    # keyset pagination by default, ?page=N keeps the page-number mode for admin clients
+    pagination_class = ProductKeysetPagination
+    page_number_pagination_class = DefaultPagination
+    ordering_fields = ['price', 'effective_price', 'last_update']
     permission_classes = [IsAdminOrReadyOnly]
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.page_number_pagination_class.page_query_param in self.request.query_params:
+                self._paginator = self.page_number_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     # ============================= filter with our logic ========================
     # def get_queryset(self):
     #     queryset = Product.objects.all()
@@ -102,8 +136,8 @@ class ProductDetailsApiView(RetrieveUpdateDestroyAPIView):
 
 class CollectionListApiView(ListCreateAPIView):
     # one way
-    queryset = Collection.objects.annotate(
-        product_count=Count('products')).all()
+    # product_count is stored on the collection, no Count('products') join needed
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializers
     permission_classes = [IsAdminOrReadyOnly]
     # an other way
@@ -115,8 +149,7 @@ class CollectionListApiView(ListCreateAPIView):
 
 
 class CollectionDetailsAPIView(RetrieveUpdateDestroyAPIView):
-    queryset = collection = Collection.objects.annotate(
-        product_count=Count('products'))
+    queryset = collection = Collection.objects.all()
     serializer_class = CollectionSerializers
 
     # def get(self, request, id):
@@ -147,45 +180,74 @@ class CollectionDetailsAPIView(RetrieveUpdateDestroyAPIView):
     #     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = collection = Collection.objects.annotate(
-        product_count=Count('products'))
+class CollectionViewSet(SerializerTimingMixin, CachedResponseMixin, FastListMixin, SparseQuerysetMixin, ModelViewSet):
+    queryset = collection = Collection.objects.all()
     serializer_class = CollectionSerializers
+    cache_models = [Collection, Product]
     permission_classes = [IsAdminOrReadyOnly]
 
     def delete(self, request, pk):
-        collection = get_object_or_404(Collection.objects.annotate(
-            product_count=Count('products')), pk=pk)
-        if collection.products.count() > 0:
+        collection = get_object_or_404(Collection, pk=pk)
+        if collection.product_count > 0:
             return Response({"error": "Collection cannot be deleted because it includes one or more  products."})
         collection.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(SerializerTimingMixin, FastListMixin, SparseQuerysetMixin, LikeMixin, ModelViewSet):
     serializer_class = ReviewSerializers
     queryset = Review.objects.all()
+    # keyset pages on (date, id), ?ordering=date for oldest first
+    pagination_class = ReviewKeysetPagination
 
-    # def get_queryset(self):
-    #     return Review.objects.filter(product_id= self.kwargs['product_pk'])
+    def get_queryset(self):
+        return super().get_queryset().filter(product_id=self.kwargs['product_pk'])
 
     def get_serializer_context(self):
-        return {"product_id": self.kwargs['product_pk']}
+        return {**super().get_serializer_context(), "product_id": self.kwargs['product_pk']}
 
 
-class CartViewSet(CreateModelMixin,
+class CartViewSet(SerializerTimingMixin,
+                  CreateModelMixin,
                   RetrieveModelMixin,
                   DestroyModelMixin,
                   GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    # cart and line totals are annotated by the database
+    queryset = carts_queryset()
     serializer_class = CartSerializers
 
+    def destroy(self, request, *args, **kwargs):
+        cart = self.get_object()
+        # give the stock held for the cart back before it disappears
+        with transaction.atomic():
+            release_carts([cart.pk])
+            self.perform_destroy(cart)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class CartItemViewSet(ModelViewSet):
+    @action(detail=True, methods=['POST'])
+    def reserve(self, request, pk=None):
+        # DRF's get_object_or_404, a malformed uuid is a 404 as well
+        cart = generics.get_object_or_404(Cart, pk=pk)
+        try:
+            (expires_at, quantities) = reserve_cart(cart.pk)
+        except InsufficientStock as error:
+            return Response({"error": f"Not enough inventory for product(s): {', '.join(map(str, error.product_ids))}."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({
+            "cart_id": cart.pk,
+            "expires_at": expires_at,
+            "items": [{"product_id": product_id, "quantity": quantity}
+                      for product_id, quantity in quantities.items()],
+        })
+
+
+class CartItemViewSet(SerializerTimingMixin, FastListMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_serializer_class(self):
-        if self.request.method == 'POST':
+        if self.action == 'bulk':
+            return BulkAddCartItemSerializer
+        elif self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
             return UpdateCartItemSerializer
@@ -196,27 +258,82 @@ class CartItemViewSet(ModelViewSet):
         return {"cart_id": self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product')
+        return cart_items_queryset().filter(cart_id=self.kwargs['cart_pk'])
+
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request, cart_pk=None):
+        generics.get_object_or_404(Cart, pk=cart_pk)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        cart = carts_queryset().get(pk=cart_pk)
+        return Response(CartSerializers(cart).data, status=status.HTTP_201_CREATED)
 
 
-class CustomerViewSet(ModelViewSet):
+class CustomerViewSet(SerializerTimingMixin, FastListMixin, SparseQuerysetMixin, ExportMixin, ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAdminUser]
 
     @action(detail=True, permission_classes=[ViewCustomerHistoryPermissions])
-    def history(self, request, pkd):
-        return Response('OK')
+    def history(self, request, pk):
+        # three queries whatever the number of orders: the customer summary, one
+        # keyset page of orders with their totals and the items of that page
+        customer = generics.get_object_or_404(Customer.objects.only('id', 'order_count', 'lifetime_spend'), pk=pk)
+        self.check_object_permissions(request, customer)
+        orders = (Order.objects.filter(customer=customer)
+                  .only('id', 'placed_at', 'payment_status')
+                  .annotate(total=order_total())
+                  .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product')
+                                             .only('id', 'order_id', 'quantity', 'unit_price', 'product', 'product__title')
+                                             .order_by('id'))))
+        paginator = OrderHistoryKeysetPagination()
+        page = paginator.paginate_queryset(orders, request, self)
+        response = paginator.get_paginated_response(
+            OrderHistorySerializer(page, many=True, context=self.get_serializer_context()).data)
+        response.data = {'order_count': customer.order_count,
+                         'lifetime_spend': customer.lifetime_spend, **response.data}
+        return response
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        (customer, created) = Customer.objects.get_or_create(
-            user_id=request.user.id)
+        # loaded with the user by CachedJWTAuthentication
+        customer = get_customer(request.user)
         if request.method == 'GET':
-            serializer = CustomerSerializer(customer)
+            serializer = CustomerSerializer(customer, context=self.get_serializer_context())
             return Response(serializer.data)
         elif request.method == 'PUT':
+            # save() writes every column, the cached copy may hold outdated order totals
+            customer = Customer.objects.get(pk=customer.pk)
             serializer = CustomerSerializer(customer, data=request.data)
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data)
+
+
+class OrderViewSet(SerializerTimingMixin,
+                   ExportMixin,
+                   CreateModelMixin,
+                   ListModelMixin,
+                   RetrieveModelMixin,
+                   GenericViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Order.objects.prefetch_related('items__product')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(customer__user_id=self.request.user.id)
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return CreateOrderSerializer
+        return OrderSerializer
+
+    def create(self, request, *args, **kwargs):
+        customer = get_customer(request.user)
+        serializer = CreateOrderSerializer(data=request.data, context={'customer': customer})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
@@ -3,12 +3,61 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
 
+def content_type_lookups(model):
+    # the content type is joined rather than looked up first, so even the first
+    # request of a process needs no query of its own for it, and the async views
+    # can build the filter without a sync ContentType lookup
+    opts = model._meta.concrete_model._meta
+    return {'content_type__app_label': opts.app_label, 'content_type__model': opts.model_name}
+
+
+class TaggedItemManager(models.Manager):
+    def get_tags_for(self, model, object_ids):
+        """{object id: [labels]} for a page of objects, in one query on (content_type, object_id)."""
+        object_ids = list(object_ids)
+        tags = {object_id: [] for object_id in object_ids}
+        for object_id, label in self.tags_queryset(model, object_ids):
+            tags[object_id].append(label)
+        return tags
+
+    async def aget_tags_for(self, model, object_ids):
+        object_ids = list(object_ids)
+        tags = {object_id: [] for object_id in object_ids}
+        async for object_id, label in self.tags_queryset(model, object_ids):
+            tags[object_id].append(label)
+        return tags
+
+    def tags_queryset(self, model, object_ids):
+        return (self.filter(**content_type_lookups(model), object_id__in=object_ids)
+                .order_by('object_id', 'tag__label', 'tag_id')
+                .values_list('object_id', 'tag__label'))
+
+    def object_ids_tagged(self, model, label):
+        """Ids of the objects of `model` tagged `label`, meant as an `id__in` subquery."""
+        return self.filter(**content_type_lookups(model), tag__label=label).values('object_id')
+
+    async def aobject_ids_tagged(self, model, label):
+        # a lazy queryset, nothing runs until the caller evaluates it
+        return self.object_ids_tagged(model, label)
+
+
 class Tag(models.Model):
-    label = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, db_index=True)
+
+    def __str__(self) -> str:
+        return self.label
 
 
 class TaggedItem(models.Model):
+    objects = TaggedItemManager()
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            # the tags of a page of objects, and the objects of a tag
+            models.Index(fields=['content_type', 'object_id'], name='tags_item_object_idx'),
+            models.Index(fields=['tag', 'content_type', 'object_id'], name='tags_item_tag_object_idx'),
+        ]
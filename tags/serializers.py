@@ -0,0 +1,31 @@
+from rest_framework import serializers
+
+from .models import TaggedItem
+
+
+class TagsField(serializers.Field):
+    """Read-only list of the labels of an object.
+
+    The tags of every object of a list are loaded by one query the first time
+    the field is rendered; the list fast path of the store API calls
+    `batch_representation` itself.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'pk'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def batch_representation(self, model, pks):
+        return TaggedItem.objects.get_tags_for(model, pks)
+
+    async def abatch_representation(self, model, pks):
+        return await TaggedItem.objects.aget_tags_for(model, pks)
+
+    def to_representation(self, pk):
+        tags = getattr(self, '_tags', None)
+        if tags is None or pk not in tags:
+            objects = getattr(self.parent.parent, 'instance', None)
+            pks = [obj.pk for obj in objects] if isinstance(self.parent.parent, serializers.ListSerializer) else [pk]
+            self._tags = tags = self.batch_representation(self.parent.Meta.model, pks)
+        return tags[pk]